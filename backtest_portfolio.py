@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+backtest_portfolio.py — 本番の売買ルールを日次で再生するバックテスト
+======================================================================
+backtest.py（週次TOP5の5日リターン）とは別に、manage_portfolio.py の
+運用ルールそのままで過去の日足を1日ずつシミュレーション:
+  1. 保有銘柄の -15% 損切り / +20% 半分利確
+  2. スコア70以上・配当2%以上から1日最大2銘柄を新規買い
+     （保有10銘柄以上・現金比率50%未満なら見送り）
+  3. 約定は execution.simulate（単元・出来高上限・スリッページ・手数料）
+
+ルール判定は manage_portfolio の exit_masks / is_buy_candidate / order_shares を
+そのまま呼ぶので、本番のルールを変えればバックテストも同じように変わる。
+
+先読み（look-ahead）について:
+  PBR・PER・時価総額は日々の履歴が取れない（手元にあるのは今日の値だけ）。今日の値を
+  株価で割り戻して過去に当てはめると未来の決算を知っている計算になるので、バックテストの
+  スコアからは外している（SCORE_EXCLUDES。PBR/PER の加点なし・小型株ペナルティなし）。
+  そのぶん本番より点数が低く出て、min_score を超える銘柄は少なめになる。
+  配当利回りだけは買い条件（2%以上）に必要なので残すが、「今日の1株配当が過去も同じ」と
+  仮定した値で、減配・増配は反映されない（= 先読みが残る）。結果 JSON の caveats にも書き出す。
+特徴量パネル（日付×銘柄の行列）を一度作れば、各シミュレーションは
+numpy 配列の更新だけで回る（日ごとのJSON読み書きなし）→ パラメータを並列スイープできる。
+
+使い方:
+  python3 backtest_portfolio.py            # 本番ルールで1回
+  python3 backtest_portfolio.py --sweep    # ルールパラメータを並列スイープ
+  python3 backtest_portfolio.py --refresh  # パネルを再ダウンロード
+"""
+
+import json, os, sys, itertools
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("必要ライブラリ: pip3 install yfinance pandas numpy")
+    sys.exit(1)
+
+import execution
+import manage_portfolio as mp
+
+# ═══════════════════════════════════════
+# 設定
+# ═══════════════════════════════════════
+INITIAL_CAPITAL = 10_000_000
+TRADING_DAYS = 245
+PANEL_PATH = os.path.join(".cache", "backtest_panel.npz")
+PANEL_VERSION = 2  # スコアの作り方を変えたら上げる（古いパネルは作り直す）
+RESULT_PATH = "backtest_portfolio_result.json"
+
+# 本番ルール（manage_portfolio.py の定数）
+LIVE_PARAMS = {
+    "min_score": mp.MIN_SCORE_BUY,
+    "max_buy_per_day": mp.MAX_BUY_PER_DAY,
+    "max_positions": mp.MAX_POSITIONS,
+    "min_cash_ratio": mp.MIN_CASH_RATIO,
+    "stop_loss_pct": mp.STOP_LOSS_PCT,
+    "take_profit_pct": mp.TAKE_PROFIT_PCT,
+}
+
+# 履歴がなく先読みになるのでバックテストのスコアに入れない項目
+SCORE_EXCLUDES = ("pbr", "per", "market_cap_b")
+CAVEATS = [
+    "スコアから PBR・PER・時価総額（小型株ペナルティ）を除外（過去の値がなく、今日の値を使うと先読みになるため）。本番より点数が低めに出る",
+    "配当利回りは今日の1株配当を過去の株価で割った値（減配・増配は反映されない先読みを含む）",
+]
+
+# --sweep で試す組み合わせ（ここに無いキーは本番ルールのまま）
+SWEEP_GRID = {
+    "min_score": [60, 70, 80],
+    "stop_loss_pct": [-10, -15, -20],
+    "take_profit_pct": [10, 20, 30],
+    "min_cash_ratio": [0.3, 0.5],
+}
+
+# ═══════════════════════════════════════
+# STEP 1: 特徴量パネル
+# ═══════════════════════════════════════
+def build_panel():
+    """日足から 日付×銘柄 の特徴量パネル（close/score/dividend/turnover/sentiment）を作る"""
+    import backtest
+    from fetch_stocks import calc_score, KOKUSAKU_THEMES
+
+    codes, data = backtest.download_universe()
+    info_map = backtest.get_stock_info_bulk(codes)
+    tickers = [f"{c}.T" for c in codes]
+    close = data["Close"].reindex(columns=tickers)
+    volume = data["Volume"].reindex(columns=tickers)
+
+    # fetch_stocks.fetch_stock_data と同じ定義の指標を列ごとに一括計算
+    ma25 = close.rolling(25, min_periods=1).mean()
+    delta = close.diff()
+    gain = delta.clip(lower=0).rolling(14).mean()
+    loss = (-delta.clip(upper=0)).rolling(14).mean()
+    rsi = (100 - 100 / (1 + gain / loss)).fillna(50).round(1)
+    vol_r = (volume.rolling(5).mean() / volume.rolling(20).mean()).fillna(1.0).round(2)
+    turnover = ((close * volume).rolling(5).mean() / 1e8).round(1)
+
+    # 配当利回りは今日の1株配当を過去の株価で割り戻す（先読みが残る → CAVEATS）
+    # PBR・PER・時価総額は過去に当てはめず、スコアから外す（SCORE_EXCLUDES）
+    last_px = close.ffill().iloc[-1]
+    ratio = close / last_px
+    static = pd.DataFrame([info_map.get(c, {}) for c in codes], index=tickers)
+    div_now = static["dividend"].where(static["dividend"] <= 20, static["dividend"] / 100)
+    dividend = (1 / ratio).mul(div_now, axis=1)
+
+    print("🧮 日次スコア計算中...")
+    score = np.full(close.shape, np.nan)
+    for j, code in enumerate(codes):
+        for t in range(len(close)):
+            px = close.iat[t, j]
+            if not np.isfinite(px):
+                continue
+            score[t, j] = calc_score({
+                "code": code,
+                "price": px,
+                "ma25": ma25.iat[t, j],
+                "rsi": rsi.iat[t, j],
+                "dividend": round(float(np.nan_to_num(dividend.iat[t, j])), 2),
+                "vol_r": vol_r.iat[t, j],
+                "kokusaku": KOKUSAKU_THEMES.get(code, ""),
+                **dict.fromkeys(SCORE_EXCLUDES),
+            })
+
+    start = np.searchsorted(close.index.values, np.datetime64(backtest.BACKTEST_START))
+    dates = [d.strftime("%Y-%m-%d") for d in close.index[start:]]
+
+    # センチメント（sentiment_data がある期間だけ値が入る。無い日・銘柄は 0）
+    try:
+        import entity_index, sentiment_index
+        from fetch_stocks import NAME_MAP
+        conn = sentiment_index.connect()
+        sentiment_index.update(conn)
+        sentiment = np.array(entity_index.feature_panel(
+            conn, entity_index.EntityIndex(name_map=NAME_MAP), dates, codes), dtype=float)
+        conn.close()
+    except Exception as e:
+        print(f"⚠ センチメント特徴量なし: {e}")
+        sentiment = np.zeros((len(dates), len(codes)))
+
+    return {
+        "dates": np.array(dates),
+        "codes": np.array(codes),
+        "close": close.values[start:],
+        "score": score[start:],
+        "dividend": dividend.values[start:],
+        "turnover": turnover.values[start:],
+        "sentiment": sentiment,
+        "version": np.array(PANEL_VERSION),
+    }
+
+
+def load_panel(refresh=False):
+    """パネルは .cache に保存して使い回す"""
+    if not refresh and os.path.exists(PANEL_PATH):
+        with np.load(PANEL_PATH) as z:
+            panel = {k: z[k] for k in z.files}
+        if int(panel.get("version", 0)) == PANEL_VERSION:
+            return panel
+        print("♻ パネルの形式が古いので作り直します")
+    panel = build_panel()
+    os.makedirs(os.path.dirname(PANEL_PATH), exist_ok=True)
+    np.savez_compressed(PANEL_PATH, **panel)
+    return panel
+
+
+# ═══════════════════════════════════════
+# STEP 2: 日次シミュレーション
+# ═══════════════════════════════════════
+def simulate(panel, params=LIVE_PARAMS):
+    """1通りのルールでポートフォリオを日次再生 → NAV系列と売買統計"""
+    close, score = panel["close"], panel["score"]
+    dividend, turnover = panel["dividend"], panel["turnover"]
+    T, N = close.shape
+
+    shares = np.zeros(N)
+    buy_price = np.zeros(N)
+    last = np.full(N, np.nan)
+    cash = float(INITIAL_CAPITAL)
+    nav = np.zeros(T)
+    traded = fees = 0.0
+    n_trades = 0
+
+    for t in range(T):
+        px = close[t]
+        valid = np.isfinite(px) & (px > 0)
+        last = np.where(valid, px, last)  # 取得できない日は前回値維持
+        held = shares > 0
+
+        # ① 損切り・利確（全保有銘柄を一括判定・一括約定）
+        pnl = np.where(held, np.round((last - buy_price) / np.where(held, buy_price, 1) * 100, 2), 0.0)
+        stop, take = mp.exit_masks(pnl, params["stop_loss_pct"], params["take_profit_pct"])
+        order = np.where(stop & held & valid, shares,
+                         np.where(take & held & valid, execution.take_profit_shares(shares), 0))
+        if order.any():
+            fill = execution.simulate(execution.SELL, np.nan_to_num(last), order, turnover[t], odd_lot=True)
+            cash += fill["amount"].sum()
+            shares -= fill["filled"]
+            buy_price = np.where(shares > 0, buy_price, 0.0)
+            traded += (fill["filled"] * fill["fill_price"]).sum()
+            fees += fill["fee"].sum()
+            n_trades += int((fill["filled"] > 0).sum())
+
+        # ② 新規買い（現金比率・保有数チェック → スコア順に最大N銘柄）
+        held = shares > 0
+        nav_t = cash + np.nansum(shares * last)
+        if cash / nav_t >= params["min_cash_ratio"] and held.sum() < params["max_positions"]:
+            cand = mp.is_buy_candidate(score[t], dividend[t], np.nan_to_num(px), params["min_score"]) & ~held & valid
+            idx = np.flatnonzero(cand)
+            idx = idx[np.argsort(-score[t, idx], kind="stable")]
+            bought = 0
+            for i in idx:
+                if bought >= params["max_buy_per_day"]:
+                    break
+                q = mp.order_shares(px[i], cash)
+                if q <= 0:
+                    continue
+                fill = execution.fill_order(execution.BUY, px[i], q, turnover[t, i])
+                if fill["filled"] < execution.LOT_SIZE or fill["amount"] > cash:
+                    continue
+                shares[i] = fill["filled"]
+                buy_price[i] = fill["fill_price"]
+                cash -= fill["amount"]
+                traded += fill["filled"] * fill["fill_price"]
+                fees += fill["fee"]
+                n_trades += 1
+                bought += 1
+
+        nav[t] = cash + np.nansum(shares * last)
+
+    return nav, {"traded": traded, "fees": fees, "trades": n_trades}
+
+
+def summarize(nav, stats):
+    """NAV系列 → リターン・ドローダウン・回転率"""
+    peak = np.maximum.accumulate(nav)
+    rets = np.diff(nav) / nav[:-1] if len(nav) > 1 else np.zeros(1)
+    years = max(len(nav) / TRADING_DAYS, 1e-9)
+    vol = float(rets.std(ddof=1)) if len(rets) > 1 else 0.0
+    return {
+        "final_nav": round(float(nav[-1])),
+        "total_return_pct": round(float(nav[-1] / INITIAL_CAPITAL - 1) * 100, 2),
+        "cagr_pct": round(float((nav[-1] / INITIAL_CAPITAL) ** (1 / years) - 1) * 100, 2),
+        "max_drawdown_pct": round(float((nav / peak - 1).min()) * 100, 2),
+        "volatility_pct": round(vol * float(np.sqrt(TRADING_DAYS)) * 100, 2),
+        "sharpe": round(float(rets.mean() / vol * np.sqrt(TRADING_DAYS)), 2) if vol > 0 else 0.0,
+        "turnover_per_year": round(float(stats["traded"]) / float(nav.mean()) / years, 2),
+        "trades": stats["trades"],
+        "fees": round(float(stats["fees"])),
+    }
+
+
+# ═══════════════════════════════════════
+# STEP 3: パラメータスイープ（並列）
+# ═══════════════════════════════════════
+_PANEL = None
+
+
+def _init_worker(panel):
+    global _PANEL
+    _PANEL = panel
+
+
+def _run_params(params):
+    nav, stats = simulate(_PANEL, params)
+    return {"params": params, **summarize(nav, stats)}
+
+
+def sweep(panel):
+    keys = list(SWEEP_GRID)
+    grid = [{**LIVE_PARAMS, **dict(zip(keys, vals))} for vals in itertools.product(*SWEEP_GRID.values())]
+    print(f"🔁 {len(grid)}通りを並列シミュレーション中...")
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(panel,)) as ex:
+        results = list(ex.map(_run_params, grid))
+    results.sort(key=lambda r: r["sharpe"], reverse=True)
+    return results
+
+
+# ═══════════════════════════════════════
+# MAIN
+# ═══════════════════════════════════════
+def main():
+    print("=" * 60)
+    print("  🔬 かぶのすけ 運用ルールバックテスト（日次）")
+    print("=" * 60)
+
+    panel = load_panel(refresh="--refresh" in sys.argv)
+    dates = panel["dates"]
+    print(f"📅 期間: {dates[0]} 〜 {dates[-1]}（{len(dates)}営業日 / {len(panel['codes'])}銘柄）")
+    for c in CAVEATS:
+        print(f"  ⚠ {c}")
+
+    nav, stats = simulate(panel)
+    live = summarize(nav, stats)
+    print(f"\n📊 本番ルール")
+    print(f"  最終NAV: ¥{live['final_nav']:,}（{live['total_return_pct']:+.2f}%）")
+    print(f"  最大DD: {live['max_drawdown_pct']:.2f}% / Sharpe: {live['sharpe']}")
+    print(f"  回転率: {live['turnover_per_year']}回/年 / 売買{live['trades']}回 / 手数料¥{live['fees']:,}")
+
+    output = {
+        "period": f"{dates[0]} 〜 {dates[-1]}",
+        "live_params": LIVE_PARAMS,
+        "score_excludes": list(SCORE_EXCLUDES),
+        "caveats": CAVEATS,
+        "live": live,
+        "daily_nav": [{"date": str(d), "nav": round(float(v))} for d, v in zip(dates, nav)],
+    }
+
+    if "--sweep" in sys.argv:
+        results = sweep(panel)
+        print(f"\n🏆 Sharpe上位5:")
+        for r in results[:5]:
+            p = r["params"]
+            print(f"  score≥{p['min_score']} 損切{p['stop_loss_pct']}% 利確+{p['take_profit_pct']}% 現金{p['min_cash_ratio']:.0%}"
+                  f" → {r['total_return_pct']:+.2f}% DD{r['max_drawdown_pct']:.1f}% Sharpe{r['sharpe']}")
+        output["sweep"] = results
+
+    with open(RESULT_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\n📁 {RESULT_PATH} に保存")
+
+
+if __name__ == "__main__":
+    main()
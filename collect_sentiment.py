@@ -3,13 +3,29 @@
 collect_sentiment.py - マーケットセンチメント収集スクリプト
 YouTube株系チャンネルの最新動画からセンチメントを抽出し、
 sentiment_data/YYYY-MM-DD.json に蓄積する。
+
+処理は並行:
+  1. 全チャンネルの動画一覧を同時に取得
+  2. 動画ごとに「字幕取得 → センチメント抽出」をワーカープール（VIDEO_WORKERS）で実行
+     Claude 呼び出しは同時 CLAUDE_WORKERS 本・毎分 SENTIMENT_RPM 回まで
+  3. 集計は CHANNELS の順・動画の順で行う（終わった順に依らず結果は毎回同じ並び）
+解析済みの動画は .cache/sentiment_videos.json（video_id → 字幕ハッシュ・抽出結果）から使い回し、
+新しい動画だけ字幕取得と抽出を行う。
 """
 
-import os, sys, json, re
+import os, sys, json, re, hashlib
 import urllib.request, urllib.parse
 from datetime import datetime, timedelta
 from pathlib import Path
+from bisect import bisect_left, bisect_right
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import http_cache
+import sentiment_index
+from keyword_matcher import KeywordMatcher
+from rate_limiter import RateLimiter
 
 # ── 定数 ──────────────────────────────────
 CHANNELS = {
@@ -27,6 +43,13 @@ CHANNELS = {
 MAX_AGE_DAYS = 7
 SENTIMENT_DIR = Path("sentiment_data")
 ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+CHANNEL_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "youtube_channels.json"
+CHANNEL_CACHE_DAYS = 90  # handle → channelId は基本変わらないので、たまに引き直すだけ
+VIDEO_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "sentiment_videos.json"
+VIDEO_CACHE_DAYS = MAX_AGE_DAYS + 3  # 一覧に出てこなくなった動画はこれで消える
+VIDEO_WORKERS = 6
+CLAUDE_WORKERS = 3
+SENTIMENT_RPM = int(os.environ.get("SENTIMENT_RPM", "40"))
 
 
 def resolve_handle(api_key, handle):
@@ -38,10 +61,9 @@ def resolve_handle(api_key, handle):
     })
     url = f"https://www.googleapis.com/youtube/v3/channels?{params}"
     try:
-        with urllib.request.urlopen(urllib.request.Request(url), timeout=10) as resp:
-            items = json.loads(resp.read().decode()).get("items", [])
-            if items:
-                return items[0]["id"]
+        items = http_cache.cached_get(url, json.load, namespace="youtube", timeout=10).get("items", [])
+        if items:
+            return items[0]["id"]
     except Exception as e:
         print(f"    ⚠ forHandle失敗: {e}")
 
@@ -51,29 +73,64 @@ def resolve_handle(api_key, handle):
     })
     url = f"https://www.googleapis.com/youtube/v3/search?{params}"
     try:
-        with urllib.request.urlopen(urllib.request.Request(url), timeout=10) as resp:
-            items = json.loads(resp.read().decode()).get("items", [])
-            if items:
-                return items[0]["snippet"]["channelId"]
+        items = http_cache.cached_get(url, json.load, namespace="youtube", timeout=10).get("items", [])
+        if items:
+            return items[0]["snippet"]["channelId"]
     except Exception as e:
         print(f"    ⚠ search失敗: {e}")
     return None
 
 
+def load_channel_cache():
+    try:
+        return json.loads(CHANNEL_CACHE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_channel_cache(cache):
+    CHANNEL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CHANNEL_CACHE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False, indent=1), encoding="utf-8")
+    tmp.replace(CHANNEL_CACHE_PATH)
+
+
+def channel_id_for(api_key, handle, cache):
+    """キャッシュ優先で @handle → channelId（期限切れ・未登録の時だけAPIで解決）"""
+    hit = cache.get(handle)
+    if hit and datetime.now() - datetime.fromisoformat(hit["resolved_at"]) < timedelta(days=CHANNEL_CACHE_DAYS):
+        return hit["channel_id"]
+    ch_id = resolve_handle(api_key, handle)
+    if ch_id:
+        cache[handle] = {"channel_id": ch_id, "resolved_at": datetime.now().isoformat(timespec="seconds")}
+    elif hit:
+        return hit["channel_id"]  # 引き直しに失敗したら古い値を使う
+    return ch_id
+
+
+def uploads_playlist_id(channel_id):
+    """チャンネルの「アップロード動画」プレイリスト（UCxxxx → UUxxxx）"""
+    return "UU" + channel_id[2:]
+
+
 def fetch_latest_videos(api_key, channel_id, max_results=3):
+    """アップロード一覧（playlistItems: 1ユニット）から過去 MAX_AGE_DAYS 日の新しい順に取得"""
     after = (datetime.utcnow() - timedelta(days=MAX_AGE_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
     params = urllib.parse.urlencode({
-        "part": "snippet", "channelId": channel_id, "maxResults": max_results,
-        "order": "date", "type": "video", "publishedAfter": after, "key": api_key,
+        "part": "snippet,contentDetails", "playlistId": uploads_playlist_id(channel_id),
+        "maxResults": max_results, "key": api_key,
     })
-    url = f"https://www.googleapis.com/youtube/v3/search?{params}"
+    url = f"https://www.googleapis.com/youtube/v3/playlistItems?{params}"
     try:
-        with urllib.request.urlopen(urllib.request.Request(url), timeout=15) as resp:
-            data = json.loads(resp.read().decode())
-        return [{"video_id": i["id"]["videoId"], "title": i["snippet"]["title"],
-                 "published": i["snippet"]["publishedAt"],
-                 "url": f"https://www.youtube.com/watch?v={i['id']['videoId']}"}
-                for i in data.get("items", []) if i["id"].get("videoId")]
+        data = http_cache.cached_get(url, json.load, namespace="youtube", timeout=15)
+        videos = []
+        for i in data.get("items", []):
+            vid = i.get("contentDetails", {}).get("videoId")
+            published = i.get("contentDetails", {}).get("videoPublishedAt") or i["snippet"].get("publishedAt", "")
+            if vid and published >= after:
+                videos.append({"video_id": vid, "title": i["snippet"]["title"], "published": published,
+                               "url": f"https://www.youtube.com/watch?v={vid}"})
+        return videos
     except Exception as e:
         print(f"  ⚠ YouTube API エラー: {e}")
         return []
@@ -90,7 +147,7 @@ def fetch_transcript(video_id):
                     entries = YouTubeTranscriptApi.get_transcript(video_id)
                 text = " ".join([e.get("text", "") if isinstance(e, dict) else str(e) for e in entries])
                 if text.strip():
-                    return text[:8000]
+                    return text  # 全文（Claude に渡す時はプロンプト側で切る）
             except Exception:
                 continue
         return None
@@ -140,38 +197,121 @@ JSONのみを出力。バッククォート不要。
         return None
 
 
+BULLISH_WORDS = ["上昇","買い","強気","期待","好決算","上がる","チャンス","押し目","反発","高配当","上方修正","最高値","買い増し"]
+BEARISH_WORDS = ["下落","売り","弱気","暴落","リスク","下がる","危険","損切","天井","過熱","下方修正","急落"]
+TOPIC_PATTERNS = [  # (表記ゆれ（先にある方を優先）, カテゴリ)
+    (["日経平均","日経225","TOPIX","日経"], "macro"), (["NVDA","NVIDIA","エヌビディア"], "stock"),
+    (["半導体"], "sector"), (["AI銘柄","AI関連"], "sector"), (["SaaS"], "sector"),
+    (["トヨタ"], "stock"), (["ソニー"], "stock"), (["任天堂"], "stock"),
+    (["信越化学"], "stock"), (["イビデン"], "stock"), (["コーエーテクモ"], "stock"),
+    (["S&P500","ナスダック","ダウ"], "macro"), (["配当","高配当"], "sector"),
+    (["円安","円高","ドル円"], "macro"), (["金利","FRB","日銀"], "macro"),
+    (["決算"], "event"), (["トランプ","関税"], "macro"),
+    (["銀行","メガバンク"], "sector"), (["防衛"], "sector"), (["不動産","REIT"], "sector"),
+]
+CONTEXT_CHARS = 200  # トピックの前後何文字の強気/弱気ワードを数えるか
+
+_TOPIC_OF = {}  # 表記 → [(パターン番号, 優先順), ...]
+for _pi, (_alts, _) in enumerate(TOPIC_PATTERNS):
+    for _rank, _w in enumerate(_alts):
+        _TOPIC_OF.setdefault(_w, []).append((_pi, _rank))
+_MATCHER = KeywordMatcher(list(_TOPIC_OF) + BULLISH_WORDS + BEARISH_WORDS)
+_BULL, _BEAR = set(BULLISH_WORDS), set(BEARISH_WORDS)
+
+
+def window_count(positions, center, width=CONTEXT_CHARS):
+    """ソート済みの出現位置リストのうち center±width に入る個数"""
+    return bisect_right(positions, center + width) - bisect_left(positions, center - width)
+
+
 def extract_sentiment_keywords(text, video_title):
-    bullish = ["上昇","買い","強気","期待","好決算","上がる","チャンス","押し目","反発","高配当","上方修正","最高値","買い増し"]
-    bearish = ["下落","売り","弱気","暴落","リスク","下がる","危険","損切","天井","過熱","下方修正","急落","暴落"]
-    patterns = [
-        (r"日経平均|日経225|TOPIX|日経", "macro"), (r"NVDA|NVIDIA|エヌビディア", "stock"),
-        (r"半導体", "sector"), (r"AI銘柄|AI関連", "sector"), (r"SaaS", "sector"),
-        (r"トヨタ", "stock"), (r"ソニー", "stock"), (r"任天堂", "stock"),
-        (r"信越化学", "stock"), (r"イビデン", "stock"), (r"コーエーテクモ", "stock"),
-        (r"S&P500|ナスダック|ダウ", "macro"), (r"配当|高配当", "sector"),
-        (r"円安|円高|ドル円", "macro"), (r"金利|FRB|日銀", "macro"),
-        (r"決算", "event"), (r"トランプ|関税", "macro"),
-        (r"銀行|メガバンク", "sector"), (r"防衛", "sector"), (r"不動産|REIT", "sector"),
-    ]
+    """1パスで全トピック・強気/弱気ワードの位置を拾い、トピック周辺の出現数で判定（全文対象）"""
+    first = {}                  # パターン番号 → (開始位置, 優先順, 表記)
+    bull_pos, bear_pos = [], []
+    for start, _, w in _MATCHER.finditer(text):
+        if w in _BULL:
+            bull_pos.append(start)
+        if w in _BEAR:
+            bear_pos.append(start)
+        for pi, rank in _TOPIC_OF.get(w, ()):
+            if pi not in first or (start, rank) < first[pi][:2]:
+                first[pi] = (start, rank, w)
+    bull_pos.sort(); bear_pos.sort()
+
     topics, seen = [], set()
-    for pat, cat in patterns:
-        ms = re.findall(pat, text)
-        if ms:
-            w = ms[0]
-            if w in seen: continue
-            seen.add(w)
-            idx = text.find(w)
-            ctx = text[max(0,idx-200):idx+200]
-            bu = sum(1 for b in bullish if b in ctx)
-            be = sum(1 for b in bearish if b in ctx)
-            s = "bullish" if bu > be else "bearish" if be > bu else "neutral"
-            topics.append({"topic":w,"category":cat,"sentiment":s,"confidence":0.4,"summary":f"キーワード: {w}"})
-    bt = sum(1 for b in bullish if b in text)
-    bt2 = sum(1 for b in bearish if b in text)
+    for pi in range(len(TOPIC_PATTERNS)):
+        if pi not in first:
+            continue
+        idx, _, w = first[pi]
+        if w in seen: continue
+        seen.add(w)
+        bu = window_count(bull_pos, idx)
+        be = window_count(bear_pos, idx)
+        s = "bullish" if bu > be else "bearish" if be > bu else "neutral"
+        topics.append({"topic":w,"category":TOPIC_PATTERNS[pi][1],"sentiment":s,"confidence":0.4,"summary":f"キーワード: {w}"})
+    bt, bt2 = len(bull_pos), len(bear_pos)
     mood = "bullish" if bt > bt2*1.3 else "bearish" if bt2 > bt*1.3 else "mixed"
     return {"topics": topics[:15], "overall_mood": mood, "key_quote": video_title[:50]}
 
 
+def load_video_cache():
+    try:
+        cache = json.loads(VIDEO_CACHE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    cutoff = (datetime.now() - timedelta(days=VIDEO_CACHE_DAYS)).strftime("%Y-%m-%d")
+    return {vid: c for vid, c in cache.items() if c.get("analyzed_at", "") >= cutoff}
+
+
+def save_video_cache(cache):
+    VIDEO_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = VIDEO_CACHE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(VIDEO_CACHE_PATH)
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def discover_videos(api_key, handle, channel_cache):
+    """@handle → (channelId, 動画リスト)"""
+    ch_id = channel_id_for(api_key, handle, channel_cache)
+    if not ch_id:
+        return None, []
+    return ch_id, fetch_latest_videos(api_key, ch_id, max_results=3)
+
+
+def analyze_video(v, ch_name, claude_key, claude_slots, limiter, cached=None):
+    """1本分: 字幕取得 → センチメント抽出（Claude → 失敗時キーワード）
+
+    cached: 前回の解析結果。同じモードで字幕ありなら何もせずそのまま返す。
+    字幕なし（タイトルで代用）だった動画は字幕だけ取り直し、中身が変わらなければ使い回す。
+    """
+    mode = "claude" if claude_key else "keywords"
+    if cached and cached["mode"] == mode and cached["has_transcript"]:
+        return {**cached, "cached": True}
+    transcript = fetch_transcript(v["video_id"])
+    has_transcript = bool(transcript)
+    if not transcript:
+        transcript = v["title"]  # タイトルをテキストとして使う
+    digest = text_hash(transcript)
+    if cached and cached["mode"] == mode and cached["transcript_sha1"] == digest:
+        return {**cached, "cached": True}
+
+    result = None
+    if claude_key:
+        with claude_slots:
+            limiter.wait()
+            result = extract_sentiment_claude(transcript, ch_name, v["title"], claude_key)
+    if not result:
+        result = extract_sentiment_keywords(transcript, v["title"])
+        mode = "keywords"
+    return {"has_transcript": has_transcript, "length": len(transcript), "transcript_sha1": digest,
+            "mode": mode, "result": result, "analyzed_at": datetime.now().strftime("%Y-%m-%d"),
+            "cached": False}
+
+
 def main():
     yt_key = os.environ.get("YOUTUBE_API_KEY", "")
     claude_key = os.environ.get("ANTHROPIC_API_KEY", "")
@@ -185,19 +325,35 @@ def main():
     SENTIMENT_DIR.mkdir(exist_ok=True)
 
     all_entries, video_count, channel_results = [], 0, {}
+    channel_cache = load_channel_cache()
+    video_cache = load_video_cache()
 
     print(f"\n{'='*50}")
     print(f"📡 MARKET SENTIMENT COLLECTOR — {today}")
     print(f"{'='*50}")
 
+    # 1. 動画一覧（全チャンネル同時）
+    with ThreadPoolExecutor(max_workers=len(CHANNELS)) as ex:
+        found = dict(zip(CHANNELS, ex.map(lambda h: discover_videos(yt_key, h, channel_cache), CHANNELS)))
+    save_channel_cache(channel_cache)
+
+    # 2. 字幕 + センチメント（動画ごとに並行）
+    claude_slots = threading.Semaphore(CLAUDE_WORKERS)
+    limiter = RateLimiter(SENTIMENT_RPM)
+    with ThreadPoolExecutor(max_workers=VIDEO_WORKERS) as ex:
+        futures = {
+            (handle, v["video_id"]): ex.submit(analyze_video, v, ch_name, claude_key if use_claude else "",
+                                               claude_slots, limiter, video_cache.get(v["video_id"]))
+            for handle, ch_name in CHANNELS.items() for v in found[handle][1]
+        }
+
+    # 3. 集計（CHANNELS の順・動画の順）
     for handle, ch_name in CHANNELS.items():
         print(f"\n📺 {ch_name} ({handle})")
-        ch_id = resolve_handle(yt_key, handle)
+        ch_id, videos = found[handle]
         if not ch_id:
             print("  → チャンネルID取得失敗"); continue
         print(f"  → ID: {ch_id}")
-
-        videos = fetch_latest_videos(yt_key, ch_id, max_results=3)
         if not videos:
             print(f"  → 過去{MAX_AGE_DAYS}日の動画なし"); continue
         print(f"  → {len(videos)}本発見")
@@ -206,17 +362,18 @@ def main():
         for v in videos:
             print(f"  🎬 {v['title'][:55]}...")
             video_count += 1
-            transcript = fetch_transcript(v["video_id"])
-            if not transcript:
-                print("    → 字幕なし、タイトルから抽出")
-                transcript = v["title"]  # タイトルをテキストとして使う
-            print(f"    → 字幕OK（{len(transcript)}文字）")
-
-            result = None
-            if use_claude:
-                result = extract_sentiment_claude(transcript, ch_name, v["title"], claude_key)
-            if not result:
-                result = extract_sentiment_keywords(transcript, v["title"])
+            try:
+                analyzed = futures[(handle, v["video_id"])].result()
+            except Exception as e:
+                print(f"    ⚠ 解析失敗: {e}"); continue
+            if analyzed["cached"]:
+                print(f"    ♻ 解析済み（{analyzed['analyzed_at']}）")
+            else:
+                if not analyzed["has_transcript"]:
+                    print("    → 字幕なし、タイトルから抽出")
+                print(f"    → 字幕OK（{analyzed['length']}文字）")
+                video_cache[v["video_id"]] = {k: val for k, val in analyzed.items() if k != "cached"}
+            result = analyzed["result"]
 
             if result and result.get("topics"):
                 for topic in result["topics"]:
@@ -235,6 +392,9 @@ def main():
 
         channel_results[ch_name] = {"bull": ch_bull, "bear": ch_bear}
 
+    save_video_cache(video_cache)
+    fresh = sum(1 for f in futures.values() if f.exception() is None and not f.result()["cached"])
+    print(f"\n♻ 動画キャッシュ: 新規解析{fresh}本 / 使い回し{len(futures) - fresh}本")
     # 集計
     tc = {}
     for e in all_entries:
@@ -256,6 +416,16 @@ def main():
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(output, f, ensure_ascii=False, indent=2)
 
+    # 時系列インデックス更新 → sentiment_trends.json
+    try:
+        conn = sentiment_index.connect()
+        sentiment_index.update(conn, str(SENTIMENT_DIR))
+        trends = sentiment_index.export_trends(conn)
+        conn.close()
+        print(f"📈 トレンド出力: sentiment_trends.json（{len(trends['topics'])}トピック）")
+    except Exception as e:
+        print(f"⚠ センチメント時系列の更新失敗: {e}")
+
     # Brain Scanner用のサマリーも出力
     brain_data = {
         "date": today,
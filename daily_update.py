@@ -3,15 +3,19 @@
 かぶのすけ 全保有銘柄の終値更新 & 自動コミット
 - yfinanceで全保有銘柄(positions + holdings)の終値を取得
 - portfolio.json の current_price / pnl_pct / total_asset を更新
-- daily_nav を追記
+- daily_nav を追記（ledger 経由。portfolio.json の daily_nav は台帳から組み立てる）
 - git add / commit / push まで自動実行
 """
 
 import json, os, sys, subprocess, datetime, time
 
+import ledger
+import risk_stats
+
 # ── パス ──
 BASE = os.path.dirname(os.path.abspath(__file__))
 PF_PATH = os.path.join(BASE, "portfolio.json")
+STOCKS_PATH = os.path.join(BASE, "stocks_data.json")
 
 TODAY = datetime.date.today().strftime("%Y-%m-%d")
 TODAY_SHORT = datetime.date.today().strftime("%Y/%m/%d")
@@ -28,6 +32,16 @@ def save_portfolio(pf):
     print("✅ portfolio.json 保存完了")
 
 
+def load_nikkei():
+    """日経平均の終値（manage_portfolio と同じく stocks_data.json の nikkei_price）"""
+    try:
+        with open(STOCKS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("nikkei_price", 0)
+    except Exception as e:
+        print(f"  ⚠️ stocks_data.json 読込失敗: {e}")
+        return 0
+
+
 def fetch_close_price(code):
     """yfinanceで終値を取得"""
     try:
@@ -101,14 +115,12 @@ def update_daily_nav(pf, total, positions_value):
         "nav": total,
         "cash": actual_cash,
         "positions_value": positions_value,
+        "nikkei": load_nikkei(),
     }
-    daily_nav = pf.get("daily_nav", [])
-    # 同日エントリがあれば上書き
-    for i, entry in enumerate(daily_nav):
-        if entry.get("date") == TODAY:
-            daily_nav[i] = nav_entry
-            return
-    daily_nav.append(nav_entry)
+    # 台帳に追記（同日は上書き）→ daily_nav は台帳から組み立てる
+    ledger.ensure(pf)
+    ledger.to_portfolio(pf, ledger.append([ledger.nav_event(nav_entry)]))
+    pf["risk"] = risk_stats.update(nav_entry, pf["daily_nav"])
 
 
 def git_commit_push(pf, total):
@@ -120,7 +132,8 @@ def git_commit_push(pf, total):
     msg = f"📊 portfolio: Day{day} {TODAY_SHORT} 全銘柄終値更新 総資産{pnl:+.1f}%"
     print(f"\n🔄 Git: {msg}")
 
-    subprocess.run(["git", "add", "portfolio.json"], cwd=BASE, check=True)
+    subprocess.run(["git", "add", "portfolio.json", "portfolio_ledger.jsonl", "portfolio_snapshot.json",
+                    "risk_stats.json"], cwd=BASE, check=True)
     subprocess.run(["git", "commit", "-m", msg], cwd=BASE, check=True)
     subprocess.run(["git", "push"], cwd=BASE, check=True)
     print("✅ push完了")
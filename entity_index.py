@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+entity_index.py - 銘柄名・通称 → 証券コードの名寄せ
+===================================================
+センチメントのトピック（「トヨタ」「ソニー」など自由記述の名前）を fetch_stocks の銘柄コードに結びつける。
+
+別名の作り方:
+  - stocks_data.json の銘柄名（= NAME_MAP の日本語名 or yfinance の名前）
+  - そこから「ホールディングス」「HD」「グループ」など会社形態の語尾だけを落とした短縮形
+    （「自動車」「銀行」のような業種語は落とさない。「三菱」だけで三菱自動車になってしまうため）
+  - MANUAL_ALIASES（通称・略称。自動生成より優先）
+複数の銘柄にぶつかる別名は曖昧なので捨てる。
+
+照合は正規化した文字列（会社形態の語尾を落としたものも）の dict 引き → だめなら KeywordMatcher（トライ）で最長一致を探し、
+それがトピックのほぼ全体（MIN_COVER 以上）を占めるときだけ採用する。
+「野村不動産」→「野村」のような部分一致で推測はせず None を返す。
+名前ごとに正規表現を回すことはしない。
+
+センチメント特徴量（sentiment_index の SQLite から、銘柄ごと）:
+  sent_mentions  直近 LOOKBACK_DAYS 日の言及数
+  sent_net       (強気 − 弱気) / 言及数
+  sent_recency   Σ (強気 − 弱気) × 0.5^(経過日数 / HALF_LIFE_DAYS)
+"""
+
+import datetime, json, os, unicodedata
+
+from keyword_matcher import KeywordMatcher
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+STOCKS_PATH = os.path.join(BASE, "stocks_data.json")
+LOOKBACK_DAYS = 14
+HALF_LIFE_DAYS = 3.0
+MIN_ALIAS_LEN = 2
+MIN_COVER = 0.8   # 部分一致を採用する最小の被覆率（別名の長さ / トピックの長さ）
+
+MANUAL_ALIASES = {
+    "トヨタ": "7203", "ホンダ": "7267", "ソニー": "6758", "任天堂": "7974",
+    "信越化学": "4063", "イビデン": "4062", "コーエーテクモ": "3635",
+    "ソフトバンクG": "9984", "ソフトバンクグループ": "9984", "SBG": "9984",
+    "東京エレクトロン": "8035", "東エレ": "8035", "レーザーテック": "6920", "アドバンテスト": "6857",
+    "キーエンス": "6861", "ファーストリテイリング": "9983", "ユニクロ": "9983",
+    "日立": "6501", "三菱重工": "7011", "川崎重工": "7012", "IHI": "7013",
+    "三菱UFJ": "8306", "三井住友FG": "8316", "みずほ": "8411",
+}
+SUFFIXES = ["フィナンシャルグループ", "ホールディングス", "グループ", "HD", "FG", "G",
+            " HOLDINGS CORPORATION", " HOLDINGS", " CORPORATION", " CO LTD", " INC"]
+
+EMPTY_FEATURES = {"sent_mentions": 0, "sent_net": 0.0, "sent_recency": 0.0}
+
+
+def normalize(text):
+    """全角/半角・大小文字・前後空白の違いを吸収"""
+    return unicodedata.normalize("NFKC", text or "").strip().upper()
+
+
+def aliases_for(name):
+    """銘柄名 → 別名の候補（正規化済み）"""
+    name = normalize(name)
+    out = {name, name.replace(" ", "")}
+    for base in list(out):
+        for suf in SUFFIXES:
+            if base.endswith(suf) and len(base) - len(suf) >= MIN_ALIAS_LEN:
+                out.add(base[:-len(suf)].strip())
+    return {a for a in out if len(a) >= MIN_ALIAS_LEN}
+
+
+def load_records(path=STOCKS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("stocks", [])
+    except Exception:
+        return []
+
+
+class EntityIndex:
+    def __init__(self, records=None, name_map=None, manual=MANUAL_ALIASES):
+        names = {}
+        for s in (load_records() if records is None else records):
+            names.setdefault(s["code"], set()).add(s.get("name", ""))
+        for code, name in (name_map or {}).items():
+            names.setdefault(code, set()).add(name)
+
+        alias_to_code, ambiguous = {}, set()
+        for code, ns in names.items():
+            for name in ns:
+                for alias in aliases_for(name):
+                    if alias_to_code.setdefault(alias, code) != code:
+                        ambiguous.add(alias)
+        for alias in ambiguous:
+            del alias_to_code[alias]
+        for alias, code in manual.items():
+            alias_to_code[normalize(alias)] = code
+
+        self.alias_to_code = alias_to_code
+        self.matcher = KeywordMatcher(list(alias_to_code))
+        self._memo = {}
+
+    def resolve(self, topic):
+        """トピック名 → 銘柄コード（見つからなければ None）"""
+        if topic in self._memo:
+            return self._memo[topic]
+        key = normalize(topic)
+        # 完全一致（トピック側の「グループ」「HD」なども落として引く）
+        code = next((self.alias_to_code[a] for a in sorted(aliases_for(key), key=len, reverse=True)
+                     if a in self.alias_to_code), None)
+        if code is None:
+            best = max(self.matcher.finditer(key), key=lambda m: m[1] - m[0], default=None)
+            if best and len(best[2]) >= MIN_COVER * len(key):
+                code = self.alias_to_code[best[2]]
+        self._memo[topic] = code
+        return code
+
+    def mentions(self, text):
+        """文章中に出てくる銘柄コードの集合"""
+        return {self.alias_to_code[w] for _, _, w in self.matcher.finditer(normalize(text))}
+
+
+def daily_polarity(conn, index, since=None):
+    """sentiment_index の集計 → {code: {date: (言及数, 強気−弱気)}}"""
+    rows = conn.execute("""
+        SELECT date, topic, SUM(bull), SUM(bear), SUM(neutral) FROM counts
+        WHERE date >= ? GROUP BY date, topic
+    """, (since or "",))
+    out = {}
+    for date, topic, bull, bear, neutral in rows:
+        code = index.resolve(topic)
+        if code is None:
+            continue
+        n, net = out.setdefault(code, {}).get(date, (0, 0))
+        out[code][date] = (n + bull + bear + neutral, net + bull - bear)
+    return out
+
+
+def _features(by_date, as_of, lookback, half_life):
+    mentions = net = 0
+    recency = 0.0
+    for date, (n, polarity) in by_date.items():
+        age = (as_of - datetime.date.fromisoformat(date)).days
+        if 0 <= age < lookback:
+            mentions += n
+            net += polarity
+            recency += polarity * 0.5 ** (age / half_life)
+    if not mentions:
+        return dict(EMPTY_FEATURES)
+    return {"sent_mentions": mentions, "sent_net": round(net / mentions, 2), "sent_recency": round(recency, 2)}
+
+
+def sentiment_features(conn, index, as_of=None, lookback=LOOKBACK_DAYS, half_life=HALF_LIFE_DAYS):
+    """as_of 時点の銘柄別センチメント特徴量 {code: {sent_mentions, sent_net, sent_recency}}"""
+    as_of = datetime.date.fromisoformat(as_of) if as_of else datetime.date.today()
+    since = (as_of - datetime.timedelta(days=lookback - 1)).isoformat()
+    return {code: _features(by_date, as_of, lookback, half_life)
+            for code, by_date in daily_polarity(conn, index, since).items()}
+
+
+def feature_panel(conn, index, dates, codes, field="sent_recency",
+                  lookback=LOOKBACK_DAYS, half_life=HALF_LIFE_DAYS):
+    """バックテスト用: 日付 × 銘柄 の特徴量（リストのリスト、言及なしは 0）"""
+    polarity = daily_polarity(conn, index)
+    rows = []
+    for d in dates:
+        as_of = datetime.date.fromisoformat(str(d))
+        rows.append([_features(polarity[c], as_of, lookback, half_life)[field] if c in polarity else 0.0
+                     for c in codes])
+    return rows
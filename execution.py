@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+execution.py - 約定シミュレーター
+==================================
+仮想ポートフォリオの売買を「実際に出せた値段」で約定させる。
+  - 単元株（100株）単位に丸める（全株売却だけは単元未満株もまとめて約定）
+  - 出来高上限: 直近5日平均売買代金（turnover_avg5）の MAX_PARTICIPATION まで → 超過分は未約定
+  - スリッページ: 片道スプレッド + √(売買代金比) に比例するマーケットインパクト
+  - 手数料: 約定代金 × FEE_RATE（最低 FEE_MIN 円）
+
+simulate() は numpy 配列をそのまま受け取るので、
+manage_portfolio の1件の注文もバックテストの全約定も同じ式で計算できる。
+"""
+
+import numpy as np
+
+LOT_SIZE = 100             # 単元株数
+FEE_RATE = 0.00055         # 手数料（約定代金比）
+FEE_MIN = 55               # 最低手数料（円）
+HALF_SPREAD_BPS = 5.0      # 片道スプレッド（bp）
+IMPACT_BPS = 100.0         # 売買代金の100%を取引した場合のインパクト（bp, √モデル）
+MAX_PARTICIPATION = 0.05   # 1日の売買代金に対する上限比率
+
+BUY, SELL = 1, -1
+
+
+def simulate(side, price, shares, turnover_avg5, odd_lot=False):
+    """約定をまとめて計算
+
+    side: BUY(+1) / SELL(-1)
+    price: 基準価格（円）
+    shares: 注文株数
+    turnover_avg5: 直近5日平均売買代金（億円）。None/NaN/0 なら出来高上限・インパクトなし
+    odd_lot: True の注文は単元に丸めない（損切りの全株売却・利確の半分売却用）
+
+    戻り値（すべて入力と同じ形の配列）:
+      filled      約定株数（単元・出来高上限で丸め済み）
+      fill_price  約定単価（スリッページ込み）
+      fee         手数料
+      amount      現金の増減額の絶対値（買い=代金+手数料 / 売り=代金-手数料）
+      cost        基準価格との差による実質コスト（スリッページ+手数料）
+    """
+    side = np.asarray(side, dtype=float)
+    price = np.asarray(price, dtype=float)
+    shares = np.asarray(shares, dtype=float)
+    turnover = np.nan_to_num(np.asarray(turnover_avg5, dtype=float) * 1e8, nan=0.0)
+    has_liq = turnover > 0
+    safe_price = np.where(price > 0, price, 1.0)
+    safe_turnover = np.where(has_liq, turnover, 1.0)
+
+    # 単元 & 出来高上限
+    lots = np.where(odd_lot, np.floor(shares), np.floor(shares / LOT_SIZE) * LOT_SIZE)
+    cap = np.where(has_liq, np.floor(safe_turnover * MAX_PARTICIPATION / safe_price / LOT_SIZE) * LOT_SIZE, lots)
+    filled = np.where(price > 0, np.clip(np.minimum(lots, cap), 0, None), 0.0)
+
+    # スリッページ（買いは高く、売りは安く）
+    participation = np.where(has_liq, filled * price / safe_turnover, 0.0)
+    slip_bps = HALF_SPREAD_BPS + IMPACT_BPS * np.sqrt(participation)
+    fill_price = price * (1 + side * slip_bps / 1e4)
+
+    notional = filled * fill_price
+    fee = np.where(filled > 0, np.maximum(notional * FEE_RATE, FEE_MIN), 0.0)
+    amount = notional + side * fee
+    cost = side * (fill_price - price) * filled + fee
+    return {"filled": filled, "fill_price": fill_price, "fee": fee, "amount": amount, "cost": cost}
+
+
+def fill_order(side, price, shares, turnover_avg5=None, odd_lot=False):
+    """1件の注文を約定（Pythonの数値で返す）"""
+    r = simulate(side, price, shares, turnover_avg5, odd_lot)
+    return {
+        "filled": int(r["filled"]),
+        "fill_price": round(float(r["fill_price"]), 1),
+        "fee": round(float(r["fee"])),
+        "amount": round(float(r["amount"])),
+        "cost": round(float(r["cost"])),
+    }
+
+
+def take_profit_shares(shares):
+    """利確の売却株数: 保有の半分（shares // 2）。単元未満になりうるので odd_lot=True で約定させる"""
+    return np.floor(np.asarray(shares, dtype=float) / 2)
+
+
+def turnover_map(stocks_data):
+    """stocks_data.json → {code: turnover_avg5}"""
+    return {s.get("code"): s.get("turnover_avg5") for s in (stocks_data or {}).get("stocks", [])}
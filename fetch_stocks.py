@@ -11,6 +11,11 @@ import numpy as np
 import pandas as pd
 import yfinance as yf
 
+import entity_index
+import sentiment_index
+import tdnet
+import tradingview
+
 # ═══════════════════════════════════════
 #  スキャン対象ユニバース（証券コード）
 # ═══════════════════════════════════════
@@ -682,11 +687,32 @@ def main():
     # 重複排除
     unique_codes = list(dict.fromkeys(UNIVERSE))
 
+    # TradingView テクニカル評価（全銘柄を数リクエストで一括取得）
+    try:
+        tv = tradingview.fetch_recommendations(unique_codes)
+        print(f"   📊 TradingView: {len(tv)} 銘柄")
+    except Exception as e:
+        print(f"   ⚠ TradingView取得失敗: {e}")
+        tv = {}
+
+    # YouTube センチメント（トピック名 → 銘柄コードに名寄せした特徴量）
+    try:
+        conn = sentiment_index.connect()
+        sentiment_index.update(conn)
+        sent = entity_index.sentiment_features(conn, entity_index.EntityIndex(name_map=NAME_MAP))
+        conn.close()
+        print(f"   💬 センチメント言及: {len(sent)} 銘柄")
+    except Exception as e:
+        print(f"   ⚠ センチメント集計失敗: {e}")
+        sent = {}
+
     for i, code in enumerate(unique_codes):
         if (i + 1) % 20 == 0:
             print(f"   ... {i+1}/{len(unique_codes)} 完了")
         data = fetch_stock_data(code)
         if data:
+            data.update(tv.get(code, {}))
+            data.update(sent.get(code, entity_index.EMPTY_FEATURES))
             # スコア計算
             data["score"] = calc_score(data)
             data["ai_score"] = calc_ai_score(data)
@@ -701,6 +727,19 @@ def main():
 
     print(f"\n✅ 取得完了: {len(stocks)} 銘柄成功 / {errors} 銘柄失敗")
 
+    # --- 本日の適時開示（TDnet） ---
+    try:
+        disclosed = tdnet.disclosures_by_code(tdnet.ingest(now), unique_codes)
+    except Exception as e:
+        print(f"⚠ TDnet取得失敗: {e}")
+        disclosed = {}
+    for s in stocks:
+        items = disclosed.get(s["code"], [])
+        s["disclosed_today"] = bool(items)
+        if items:
+            s["disclosures"] = [{"time": d["time"], "title": d["title"][:80], "url": d["url"]} for d in items[:3]]
+    print(f"📋 本日開示あり: {len(disclosed)} 銘柄")
+
     # --- スコアでソート ---
     stocks.sort(key=lambda s: s.get("score", 0), reverse=True)
 
@@ -1,12 +1,32 @@
 #!/usr/bin/env python3
 """
 かぶのすけ AIコメンタリー生成 — generate_commentary.py (Gemini版)
+=================================================================
+プロンプトは2つに分けて組み立てる:
+  - 静的部分（キャラ設定・出力形式・分析方針）= SYSTEM_INSTRUCTION
+    Gemini のコンテキストキャッシュに載せて使い回す（使えなければ system_instruction で送る）
+  - 動的部分（銘柄行・センチメント）= build_prompt()
+    前回と同じ内容の銘柄行は送らず、前回のコメントをそのまま使う。
+    送る銘柄行は PROMPT_TOKEN_BUDGET（概算トークン）に収まる分まで。
+
+COMMENTARY_MODE=sharded（または --sharded）なら、市況+インタビューの1回と
+STOCK_BATCH_SIZE 銘柄ずつの個別コメント呼び出しを SHARD_WORKERS 本並列で投げる。
+1本が遅い・途中で切れても、その分だけ出し直し/省略で済む。
+
+入力（銘柄行 + 指示文、センチメント）のハッシュを commentary.json の input_hash に残し、
+  - どちらも前回と同じ → API を呼ばずに前回の commentary.json をそのまま使う（週末など）
+  - センチメントだけ変わった → インタビューだけ作り直す
+--force で常に作り直す。
 """
 
-import json, os, sys, datetime
+import json, os, sys, datetime, hashlib, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import RateLimiter
 
 try:
     from google import genai
+    from google.genai import types
 except ImportError:
     print("⚠ google-genai パッケージがありません。pip3 install google-genai")
     sys.exit(1)
@@ -16,85 +36,71 @@ if not API_KEY:
     print("⚠ GEMINI_API_KEY が未設定です。フォールバックで生成します。")
     client = None
 else:
-    client = genai.Client(api_key=API_KEY)
+    client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(timeout=int(os.environ.get("LLM_TIMEOUT_SEC", "90")) * 1000))
 MODEL = "models/gemini-2.0-flash"
 
-def load_json(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠ {path} 読込失敗: {e}")
-        return None
-
-
-def build_prompt(stocks_data, sentiment_data):
-    stocks = sorted(
-        [s for s in stocks_data.get("stocks", []) if s.get("market_cap_b", 0) > 0],
-        key=lambda s: s.get("market_cap_b", 0),
-        reverse=True,
-    )[:30]
-
-    stock_lines = []
-    for s in stocks:
-        stock_lines.append(
-            f"{s.get('code')} {s.get('name')} "
-            f"現値{s.get('price')} 前日比{s.get('change_pct',0):.1f}% "
-            f"RSI{s.get('rsi','-')} 配当{s.get('dividend_yield',0):.1f}% "
-            f"PBR{s.get('pbr','-')} 時価総額{s.get('market_cap_b',0):.0f}B"
-        )
-
-    sentiment_text = ""
-    if sentiment_data:
-        macro = sentiment_data.get("macro", [])
-        if isinstance(macro, list):
-            bull_words = [m["word"] for m in macro if m.get("mood") in ("greed", "hope", "calm")][:5]
-            bear_words = [m["word"] for m in macro if m.get("mood") in ("fear", "panic")][:5]
-        else:
-            bull_words = macro.get("word", {}).get("bull", [])[:5]
-            bear_words = macro.get("word", {}).get("bear", [])[:5]
-        sentiment_text = f"""
-YouTubeセンチメント:
-  強気ワード: {", ".join(bull_words)}
-  弱気ワード: {", ".join(bear_words)}
-"""
-
-    prompt = f"""あなたは日本株の個人投資家向けAIアナリスト「かぶのすけ」です。
-以下のデータを分析し、JSONのみを返してください（前置き・説明・マークダウン不要）。
-
-【株式データ TOP30（時価総額順）】
-{chr(10).join(stock_lines)}
-
-{sentiment_text}
+COMMENTARY_PATH = "commentary.json"
+STATE_PATH = os.path.join(".cache", "commentary_state.json")
+MAX_STOCKS = 30
+PROMPT_TOKEN_BUDGET = int(os.environ.get("COMMENTARY_TOKEN_BUDGET", "4000"))
+CONTEXT_CACHE_TTL_SEC = 6 * 3600
+REPAIR_ATTEMPTS = 1
+FORCE = "--force" in sys.argv
+SHARDED = os.environ.get("COMMENTARY_MODE", "single") == "sharded" or "--sharded" in sys.argv
+STOCK_BATCH_SIZE = int(os.environ.get("COMMENTARY_BATCH_SIZE", "8"))
+SHARD_WORKERS = int(os.environ.get("COMMENTARY_WORKERS", "3"))
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "15"))
+
+_limiter = RateLimiter(GEMINI_RPM)
+_state_lock = threading.Lock()
+
+SECTIONS = ("market", "stocks", "interview")
+DAILY_FEELS = ["sunny", "sunset", "storm"]
+SIGNALS = ["buy", "watch", "caution"]
+INTERVIEW_QUESTIONS = [
+    "ねえおにいちゃん、今日の相場ってどう見てるの？",
+    "今日SNSとかで何が話題になってたの？",
+    "気になってる銘柄とかニュースあった？",
+    "今って無理して買わない方がいい感じ？",
+    "来週どうなりそう？おにいちゃん的には？",
+    "じゃあ今日は何の日って感じ？",
+    "最後に一言！",
+]
+
+SYSTEM_INSTRUCTION = """あなたは日本株の個人投資家向けAIアナリスト「かぶのすけ」です。
+渡されたデータを分析し、JSONのみを返してください（前置き・説明・マークダウン不要）。
 
 【出力形式】必ずこのJSON構造のみ返すこと：
-{{
-  "market": {{
+{
+  "market": {
     "comment": "市場全体の状況を2〜3文で（かぶのすけの一人称、です・ます調）",
     "daily_feel": "sunny | sunset | storm のいずれか1語のみ（sunny=堅調、sunset=やや不安、storm=波乱）",
     "tags": ["タグ1（絵文字+短文）", "タグ2", "タグ3", "タグ4", "タグ5"]
-  }},
-  "stocks": {{
-    "銘柄コード": {{
+  },
+  "stocks": [
+    {
+      "code": "銘柄コード",
       "text": "個別コメント（<strong>強調</strong>タグ使用可、2〜3文）",
       "signal": "buy | watch | caution のいずれか"
-    }}
-  }},
+    }
+  ],
   "interview": [
-    {{"q": "ねえおにいちゃん、今日の相場ってどう見てるの？", "a": "かぶのすけの答え（20〜40文字、です・ます口調）"}},
-    {{"q": "今日SNSとかで何が話題になってたの？", "a": "かぶのすけの答え（YouTubeセンチメントを踏まえて20〜50文字）"}},
-    {{"q": "気になってる銘柄とかニュースあった？", "a": "かぶのすけの答え（個別銘柄ニュースを1つ取り上げて30〜50文字）"}},
-    {{"q": "今って無理して買わない方がいい感じ？", "a": "かぶのすけの答え（20〜50文字）"}},
-    {{"q": "来週どうなりそう？おにいちゃん的には？", "a": "かぶのすけの答え（○○次第ですね、という形で20〜50文字）"}},
-    {{"q": "じゃあ今日は何の日って感じ？", "a": "かぶのすけの答え（一言で今日を表現、20〜40文字）"}},
-    {{"q": "最後に一言！", "a": "かぶのすけの答え（その日の相場状況に合った格言で締める。例：『ルールは、感情が正しいと言い張るときのためにある。』『動かないことも、判断です。』『相場は、焦った人から退場していく。』『嵐の夜に窓を開けない。それだけです。』『下がる理由がある間は、安いとは言えない。』『市場は短期的には投票機、長期的には体重計。』『強欲なときに恐れ、恐れているときに強欲に。でも今夜は、まだその日じゃない。』から状況に合うものを選ぶ）"}}
+    {"q": "ねえおにいちゃん、今日の相場ってどう見てるの？", "a": "かぶのすけの答え（20〜40文字、です・ます口調）"},
+    {"q": "今日SNSとかで何が話題になってたの？", "a": "かぶのすけの答え（YouTubeセンチメントを踏まえて20〜50文字）"},
+    {"q": "気になってる銘柄とかニュースあった？", "a": "かぶのすけの答え（個別銘柄ニュースを1つ取り上げて30〜50文字）"},
+    {"q": "今って無理して買わない方がいい感じ？", "a": "かぶのすけの答え（20〜50文字）"},
+    {"q": "来週どうなりそう？おにいちゃん的には？", "a": "かぶのすけの答え（○○次第ですね、という形で20〜50文字）"},
+    {"q": "じゃあ今日は何の日って感じ？", "a": "かぶのすけの答え（一言で今日を表現、20〜40文字）"},
+    {"q": "最後に一言！", "a": "かぶのすけの答え（その日の相場状況に合った格言で締める。例：『ルールは、感情が正しいと言い張るときのためにある。』『動かないことも、判断です。』『相場は、焦った人から退場していく。』『嵐の夜に窓を開けない。それだけです。』『下がる理由がある間は、安いとは言えない。』『市場は短期的には投票機、長期的には体重計。』『強欲なときに恐れ、恐れているときに強欲に。でも今夜は、まだその日じゃない。』から状況に合うものを選ぶ）"}
   ]
-}}
+}
 
 【分析方針】
+- stocks には【株式データ】に載っている銘柄だけを書く（「前回から変化なし」の銘柄は書かない）
 - テンプレ的な「RSI○○で売られすぎ」だけの分析はNG。もっと踏み込む
 - 「なぜこの銘柄が今注目か」を1文で説明すること
 - YouTubeセンチメントに関連する銘柄があれば、投資家の温度感を必ず織り交ぜる
+- 「本日開示」がある銘柄は、その開示内容に必ず触れる
 - 複数の指標を組み合わせた分析をする
 - 「買い」「売り」の断定はせず、「面白い水準」「注意が必要」のようにヒントを出す
 - 同じフレーズの使い回しを避ける
@@ -104,19 +110,268 @@ YouTubeセンチメント:
 - interviewの「来週どうなりそう？」は必ず「〇〇次第ですね」という形で締める
 - interviewは感情が伝わるように。怖い時は怖い、強気な時は強気と正直に
 """
-    return prompt
 
+def load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠ {path} 読込失敗: {e}")
+        return None
 
-def build_fallback(stocks_data):
-    """Gemini API が不安定なときに返す固定テキストのフォールバック"""
-    stocks = sorted(
-        [s for s in stocks_data.get("stocks", []) if s.get("market_cap_b", 0) > 0],
+
+def save_json(path, data, indent=2):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp, path)
+
+
+def load_state():
+    """前回送った銘柄行・コンテキストキャッシュ名（無ければ空）"""
+    if not os.path.exists(STATE_PATH):
+        return {}
+    return load_json(STATE_PATH) or {}
+
+
+def estimate_tokens(text):
+    """入力トークンの概算（日本語は1文字≒1トークンで見積もる）"""
+    return len(text)
+
+
+def change_pct(s):
+    """前日比(%)。fetch_stocks は出さないので closes_60d の最後の2本から計算する"""
+    closes = s.get("closes_60d") or []
+    if len(closes) >= 2 and closes[-2]:
+        return round((closes[-1] / closes[-2] - 1) * 100, 2)
+    return s.get("change_pct") or 0
+
+
+def top_stocks(stocks_data, n=MAX_STOCKS):
+    return sorted(
+        [s for s in stocks_data.get("stocks", []) if (s.get("market_cap_b") or 0) > 0],
         key=lambda s: s.get("market_cap_b", 0),
         reverse=True,
-    )[:5]
+    )[:n]
+
+
+def stock_line(s):
+    return (
+        f"{s.get('code')} {s.get('name')} "
+        f"現値{s.get('price')} 前日比{change_pct(s):.1f}% "
+        f"RSI{s.get('rsi','-')} 配当{s.get('dividend') or 0:.1f}% "
+        f"PBR{s.get('pbr','-')} 時価総額{s.get('market_cap_b',0):.0f}B"
+        + (f" 本日開示「{s['disclosures'][0]['title']}」" if s.get("disclosures") else "")
+    )
+
+
+def build_sentiment_text(sentiment_data):
+    if not sentiment_data:
+        return ""
+    macro = sentiment_data.get("macro", [])
+    if isinstance(macro, list):
+        bull_words = [m["word"] for m in macro if m.get("mood") in ("greed", "hope", "calm")][:5]
+        bear_words = [m["word"] for m in macro if m.get("mood") in ("fear", "panic")][:5]
+    else:
+        bull_words = macro.get("word", {}).get("bull", [])[:5]
+        bear_words = macro.get("word", {}).get("bear", [])[:5]
+    sentiment_text = f"""
+YouTubeセンチメント:
+  強気ワード: {", ".join(bull_words)}
+  弱気ワード: {", ".join(bear_words)}
+"""
+    trends = load_json("sentiment_trends.json") or {}
+    rising = [t for t in sorted(trends.get("topics", []), key=lambda t: -t.get("momentum", 0))
+              if t.get("momentum", 0) > 0][:5]
+    if rising:
+        sentiment_text += "  直近7日で話題が増えたテーマ: " + ", ".join(
+            f"{t['topic']}（言及{t['mentions_7d']}件, 強気比{t['bull_ratio_7d'] if t['bull_ratio_7d'] is not None else '-'}）"
+            for t in rising) + "\n"
+    return sentiment_text
+
+
+def build_prompt(stocks_data, sentiment_data, prev_lines=None, prev_stocks=None, budget=PROMPT_TOKEN_BUDGET):
+    """動的部分のプロンプト → (prompt, 送った/使い回す銘柄行 {code: line}, 使い回すコメント {code: {...}})
+
+    前回と同じ銘柄行で前回コメントがあるものは送らない。残りは開示あり → 時価総額順に
+    budget（概算トークン）に収まるところまで送る。
+    """
+    prev_lines, prev_stocks = prev_lines or {}, prev_stocks or {}
+    stocks = top_stocks(stocks_data)
+    lines = {str(s["code"]): stock_line(s) for s in stocks}
+    reused = {c: prev_stocks[c] for c, line in lines.items() if prev_lines.get(c) == line and c in prev_stocks}
+    changed = sorted((str(s["code"]) for s in stocks if str(s["code"]) not in reused),
+                     key=lambda c: "本日開示" not in lines[c])
+
+    sentiment_text = build_sentiment_text(sentiment_data)
+    used = estimate_tokens(sentiment_text) + 200
+    sent = []
+    for c in changed:
+        cost = estimate_tokens(lines[c]) + 1
+        if used + cost > budget:
+            print(f"   ✂ トークン予算超過: {len(changed) - len(sent)} 銘柄を今回は省略")
+            break
+        sent.append(c)
+        used += cost
+
+    sent_text = "\n".join(lines[c] for c in sent) or "（なし）"
+    prompt = f"""【株式データ（時価総額順・前回から変化した銘柄）】
+{sent_text}
+"""
+    if reused:
+        names = " / ".join(f"{s['code']} {s.get('name')}" for s in stocks if str(s["code"]) in reused)
+        prompt += f"""
+【前回から変化なし（コメント不要・市場全体の判断材料としてのみ使う）】
+{names}
+"""
+    prompt += sentiment_text
+    return prompt, {c: lines[c] for c in sent + list(reused)}, reused
+
+
+def input_hashes(stocks_data, sentiment_data):
+    """メモ化キー。銘柄側（モデル・指示文・銘柄行）とセンチメント側を別々にハッシュする"""
+    def digest(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    stocks_src = "\n".join([MODEL, SYSTEM_INSTRUCTION] + [stock_line(s) for s in top_stocks(stocks_data)])
+    return {"stocks": digest(stocks_src), "sentiment": digest(build_sentiment_text(sentiment_data))}
+
+
+def stock_prompt(codes, lines, sentiment_text):
+    """並列モードの個別コメント用（この銘柄たちの行とセンチメントだけ）"""
+    return f"""【株式データ（この銘柄の個別コメントだけを書く）】
+{chr(10).join(lines[c] for c in codes)}
+{sentiment_text}"""
+
+
+def response_schema(sections=SECTIONS):
+    """Gemini の構造化出力スキーマ（sections で指定した部分だけ）"""
+    text = {"type": "STRING"}
+    props = {
+        "market": {
+            "type": "OBJECT",
+            "properties": {
+                "comment": text,
+                "daily_feel": {"type": "STRING", "enum": DAILY_FEELS},
+                "tags": {"type": "ARRAY", "items": text, "min_items": 3, "max_items": 5},
+            },
+            "required": ["comment", "daily_feel", "tags"],
+            "property_ordering": ["comment", "daily_feel", "tags"],
+        },
+        "stocks": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"code": text, "text": text, "signal": {"type": "STRING", "enum": SIGNALS}},
+                "required": ["code", "text", "signal"],
+                "property_ordering": ["code", "text", "signal"],
+            },
+        },
+        "interview": {
+            "type": "ARRAY",
+            "items": {"type": "OBJECT", "properties": {"q": text, "a": text}, "required": ["q", "a"],
+                      "property_ordering": ["q", "a"]},
+            "min_items": len(INTERVIEW_QUESTIONS),
+            "max_items": len(INTERVIEW_QUESTIONS),
+        },
+    }
+    return {"type": "OBJECT", "properties": {k: props[k] for k in sections},
+            "required": list(sections), "property_ordering": list(sections)}
+
+
+def _text(v):
+    return isinstance(v, str) and bool(v.strip())
+
+
+def validate(result, codes, sections=SECTIONS):
+    """sections の各セクションを検査 → (正しかった部分, {セクション: 理由})
+
+    stocks は銘柄単位で、正しいものだけ {code: {text, signal}} に入れる（codes 以外は捨てる）。
+    """
+    ok, errors = {"stocks": {}}, {}
+    if not isinstance(result, dict):
+        return ok, {sec: "JSONオブジェクトでない" for sec in sections}
+
+    market = result.get("market")
+    if "market" not in sections:
+        pass
+    elif not isinstance(market, dict):
+        errors["market"] = "market が無い"
+    elif not _text(market.get("comment")):
+        errors["market"] = "comment が空"
+    elif market.get("daily_feel") not in DAILY_FEELS:
+        errors["market"] = f"daily_feel が不正: {market.get('daily_feel')!r}"
+    elif not isinstance(market.get("tags"), list) or not [t for t in market["tags"] if _text(t)]:
+        errors["market"] = "tags が空"
+    else:
+        ok["market"] = {"comment": market["comment"].strip(), "daily_feel": market["daily_feel"],
+                        "tags": [t for t in market["tags"] if _text(t)][:5]}
+
+    stocks = ok["stocks"]
+    for item in result.get("stocks") or []:
+        if not isinstance(item, dict):
+            continue
+        code = str(item.get("code", "")).strip()
+        if code in codes and _text(item.get("text")) and item.get("signal") in SIGNALS:
+            stocks[code] = {"text": item["text"].strip(), "signal": item["signal"]}
+    missing = [c for c in codes if c not in stocks]
+    if "stocks" in sections and missing:
+        errors["stocks"] = f"{len(missing)} 銘柄が欠落/不正"
+
+    interview = result.get("interview")
+    if "interview" not in sections:
+        pass
+    elif not isinstance(interview, list) or len(interview) != len(INTERVIEW_QUESTIONS):
+        errors["interview"] = f"{len(interview) if isinstance(interview, list) else 0}問（{len(INTERVIEW_QUESTIONS)}問必要）"
+    elif not all(isinstance(t, dict) and _text(t.get("a")) for t in interview):
+        errors["interview"] = "空の回答がある"
+    else:
+        ok["interview"] = [{"q": q, "a": t["a"].strip()} for q, t in zip(INTERVIEW_QUESTIONS, interview)]
+    return ok, errors
+
+
+def parse_json(text):
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        print(f"⚠ JSON パース失敗: {e}")
+        print(f"レスポンス先頭200文字: {(text or '')[:200]}")
+        return None
+
+
+def context_config(state):
+    """静的部分の渡し方。コンテキストキャッシュが使えれば cached_content、だめなら system_instruction"""
+    with _state_lock:
+        return _context_config(state)
+
+
+def _context_config(state):
+    key = hashlib.sha1(f"{MODEL}\n{SYSTEM_INSTRUCTION}".encode("utf-8")).hexdigest()
+    cached = state.get("context_cache") or {}
+    if cached.get("key") == key:
+        if cached.get("unsupported"):
+            return {"system_instruction": SYSTEM_INSTRUCTION}
+        if cached.get("expires", 0) > time.time() + 300:
+            return {"cached_content": cached["name"]}
+    try:
+        cache = client.caches.create(model=MODEL, config=types.CreateCachedContentConfig(
+            system_instruction=SYSTEM_INSTRUCTION, ttl=f"{CONTEXT_CACHE_TTL_SEC}s",
+            display_name="kabunosuke-commentary"))
+        state["context_cache"] = {"key": key, "name": cache.name, "expires": time.time() + CONTEXT_CACHE_TTL_SEC}
+        return {"cached_content": cache.name}
+    except Exception as e:
+        # 最小トークン数に届かない・モデル非対応など。指示文が変わるまで再挑戦しない
+        print(f"   ℹ コンテキストキャッシュ不可（{e}）→ system_instruction で送信")
+        state["context_cache"] = {"key": key, "unsupported": True}
+        return {"system_instruction": SYSTEM_INSTRUCTION}
+
+
+def build_fallback(stocks_data):
+    """Gemini API が不安定なときに返す固定テキストのフォールバック"""
+    stocks = top_stocks(stocks_data, 5)
 
     # 簡易的な市場全体の方向感を計算
-    changes = [s.get("change_pct", 0) for s in stocks_data.get("stocks", []) if s.get("change_pct") is not None]
+    changes = [change_pct(s) for s in stocks_data.get("stocks", [])]
     avg_change = sum(changes) / len(changes) if changes else 0
     up_count = sum(1 for c in changes if c > 0)
     down_count = sum(1 for c in changes if c < 0)
@@ -141,7 +396,7 @@ def build_fallback(stocks_data):
     for s in stocks:
         code = s.get("code", "")
         name = s.get("name", "")
-        chg = s.get("change_pct", 0)
+        chg = change_pct(s)
         if chg > 0:
             text = f"<strong>{name}</strong>は前日比+{chg:.1f}%。引き続き注目しています。"
             signal = "watch"
@@ -172,30 +427,130 @@ def build_fallback(stocks_data):
     }
 
 
-def generate(stocks_data, sentiment_data):
-    prompt = build_prompt(stocks_data, sentiment_data)
-    print("🤖 Gemini API 呼び出し中...")
-
-    response = client.models.generate_content(
-        model=MODEL,
-        contents=prompt
-    )
-    text = response.text.strip()
-
-    if text.startswith("```"):
-        text = text.split("\n", 1)[-1]
-    if text.endswith("```"):
-        text = text.rsplit("```", 1)[0]
-    text = text.strip()
-
+def call_gemini(prompt, state, sections=SECTIONS):
+    """構造化出力（JSON スキーマ指定）で1回呼ぶ → レスポンス本文"""
+    config = context_config(state)
+    output = {"response_mime_type": "application/json", "response_schema": response_schema(sections)}
+    _limiter.wait()
     try:
-        result = json.loads(text)
-    except json.JSONDecodeError as e:
-        print(f"⚠ JSON パース失敗: {e}")
-        print(f"レスポンス先頭200文字: {text[:200]}")
+        response = client.models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(**config, **output),
+        )
+    except Exception as e:
+        if "cached_content" not in config:
+            raise
+        # キャッシュが先に失効していた等 → 指示文を直接付けて1回だけやり直す
+        print(f"   ⚠ コンテキストキャッシュ利用失敗: {e}")
+        with _state_lock:
+            state.pop("context_cache", None)
+        _limiter.wait()
+        response = client.models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTION, **output),
+        )
+    return response.text
+
+
+def request_sections(prompt, state, sections, codes):
+    """1回呼んで検査し、不正なセクション（stocks は欠けた銘柄）だけ出し直してもらう → (ok, errors)"""
+    ok, errors = validate(parse_json(call_gemini(prompt, state, sections)), codes, sections)
+    for _ in range(REPAIR_ATTEMPTS):
+        if not errors:
+            break
+        print("   🔁 再依頼: " + " / ".join(f"{sec}（{why}）" for sec, why in errors.items()))
+        missing = [c for c in codes if c not in ok["stocks"]]
+        repair = prompt + "\n【再依頼】前回の出力は次の部分が不正でした。この部分だけを出し直してください: " + ", ".join(errors)
+        if "stocks" in errors:
+            repair += "\nstocks は次の銘柄だけ: " + ", ".join(missing)
+        fixed, still = validate(parse_json(call_gemini(repair, state, tuple(errors))), missing, tuple(errors))
+        for sec in errors:
+            if sec == "stocks":
+                ok["stocks"].update(fixed["stocks"])
+            elif sec in fixed:
+                ok[sec] = fixed[sec]
+        errors = {sec: why for sec, why in still.items() if sec in errors}
+    return ok, errors
+
+
+def request_sharded(prompt, state, codes, lines, sentiment_data):
+    """市況+インタビュー1本と、銘柄バッチを並列に → (結果をまとめた ok, 失敗したシャード名のリスト)
+
+    例外で落ちた・出し直しても不正が残ったシャードを失敗として返す。
+    """
+    batches = [codes[i:i + STOCK_BATCH_SIZE] for i in range(0, len(codes), STOCK_BATCH_SIZE)]
+    sentiment_text = build_sentiment_text(sentiment_data)
+    print(f"   ⚡ 並列モード: 市況+インタビュー 1本 + 銘柄 {len(batches)}バッチ（同時 {SHARD_WORKERS}本）")
+    context_config(state)  # キャッシュ作成は並列に走らせる前に1回だけ
+    ok, failed = {"stocks": {}}, []
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as pool:
+        futures = {"market/interview": pool.submit(request_sections, prompt, state, ("market", "interview"), [])}
+        for b in batches:
+            futures["stocks:" + ",".join(b)] = pool.submit(
+                request_sections, stock_prompt(b, lines, sentiment_text), state, ("stocks",), b)
+        for name, f in futures.items():
+            try:
+                part, errors = f.result()
+            except Exception as e:
+                print(f"   ⚠ 並列呼び出しの1本が失敗（{name}）: {e}")
+                failed.append(name)
+                continue
+            if errors:
+                failed.append(name)
+            ok["stocks"].update(part.pop("stocks"))
+            ok.update(part)
+    return ok, failed
+
+
+def generate(stocks_data, sentiment_data, state, prev_stocks=None):
+    """→ (result or None, 完全か)。完全 = 全セクションがモデル製で、対象の全銘柄にコメントがある"""
+    prompt, lines, reused = build_prompt(stocks_data, sentiment_data, state.get("lines"), prev_stocks)
+    codes = [c for c in lines if c not in reused]
+    print(f"🤖 Gemini API 呼び出し中...（送信 {len(codes)} 銘柄 / 前回コメント流用 {len(reused)} 銘柄 / 約{estimate_tokens(prompt)}トークン）")
+
+    failed = []
+    if SHARDED and codes:
+        ok, failed = request_sharded(prompt, state, codes, lines, sentiment_data)
+    else:
+        ok, _ = request_sections(prompt, state, SECTIONS, codes)
+
+    if "market" not in ok and "interview" not in ok and not ok["stocks"]:
+        return None, False
+    filled = [sec for sec in ("market", "interview") if sec not in ok]
+    for sec in filled:
+        print(f"   ⚠ {sec} は固定テキストで補完")
+        ok[sec] = build_fallback(stocks_data)[sec]
+    missing = [c for c in codes if c not in ok["stocks"]]
+    if missing:
+        print(f"   ⚠ 個別コメントなし: {', '.join(missing)}")
+
+    # 変化なしの銘柄は前回コメントを差し込み、時価総額順に並べ直す
+    merged = dict(reused)
+    merged.update(ok["stocks"])
+    result = {"market": ok["market"], "stocks": {c: merged[c] for c in lines if c in merged},
+              "interview": ok["interview"]}
+    if failed:
+        result["failed_shards"] = failed  # 次回はメモ化で済ませず作り直す
+    state["lines"] = {c: lines[c] for c in result["stocks"]}
+    # 予算で省いた銘柄・失敗シャードの銘柄・固定文で埋めたセクションがあれば不完全
+    complete = not failed and not filled and all(str(s["code"]) in result["stocks"] for s in top_stocks(stocks_data))
+    return result, complete
+
+
+def refresh_interview(previous, stocks_data, sentiment_data, state):
+    """銘柄側は前回と同じでセンチメントだけ変わった → インタビューだけ作り直した結果（失敗なら None）"""
+    prompt, _, _ = build_prompt(stocks_data, sentiment_data)
+    prompt += f"""
+【本日の市況コメント（作成済み）】
+{previous["market"].get("comment", "")}
+"""
+    print(f"🤖 Gemini API 呼び出し中...（センチメントのみ更新 → インタビューだけ作り直し / 約{estimate_tokens(prompt)}トークン）")
+    ok, _ = request_sections(prompt, state, ("interview",), [])
+    if "interview" not in ok:
         return None
-
-    return result
+    return {**previous, "interview": ok["interview"]}
 
 
 def main():
@@ -211,27 +566,51 @@ def main():
     if not sentiment_data:
         print("⚠ sentiment_latest.json なし。YouTube情報なしで生成します。")
 
-    if client is None:
-        result = None
-    else:
+    hashes = input_hashes(stocks_data, sentiment_data)
+    previous = (load_json(COMMENTARY_PATH) if os.path.exists(COMMENTARY_PATH) else None) or {}
+    memo = previous.get("input_hash") or {}
+    if previous.get("failed_shards"):
+        memo = {}  # 前回失敗したシャードがある → 使い回さずに作り直す
+    if memo == hashes and not FORCE:
+        print(f"♻ 入力が前回（{previous.get('date', '?')}）と同じ → commentary.json をそのまま使います（API呼び出しなし）")
+        return
+
+    state = load_state()
+    result, complete = None, False
+    if client is not None and not FORCE and memo.get("stocks") == hashes["stocks"] and previous.get("market"):
+        try:
+            result = refresh_interview(previous, stocks_data, sentiment_data, state)
+            complete = result is not None  # input_hash があった前回 = 完全だった
+        except Exception as e:
+            print(f"⚠️ Gemini API呼び出し失敗: {e}")
+    if result is None and client is not None:
         try:
-            result = generate(stocks_data, sentiment_data)
+            result, complete = generate(stocks_data, sentiment_data, state,
+                                        previous.get("stocks") if state.get("lines") else None)
         except Exception as e:
             print(f"⚠️ Gemini API呼び出し失敗: {e}")
-            result = None
 
-    if not result:
+    if result and complete:
+        result["input_hash"] = hashes
+    elif result:
+        result.pop("input_hash", None)
+        print("   ⚠ 一部が欠けたコメントなので input_hash は残しません（次回は作り直します）")
+    elif memo.get("stocks") == hashes["stocks"] and previous.get("market"):
+        print("♻ API失敗 → 銘柄データは前回と同じなので、前回の commentary.json を残します")
+        return
+    else:
         print("🔄 フォールバック: 固定テキストで commentary.json を生成します")
         result = build_fallback(stocks_data)
+        state["lines"] = {}  # 固定文は次回に使い回さない
 
     result["date"] = now.strftime("%Y/%m/%d %H:%M") + " 自動生成"
 
-    with open("commentary.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    save_json(COMMENTARY_PATH, result)
+    save_json(STATE_PATH, state, indent=1)
 
     market_tags = len(result.get("market", {}).get("tags", []))
     stock_comments = len(result.get("stocks", {}))
-    file_size = os.path.getsize("commentary.json") / 1024
+    file_size = os.path.getsize(COMMENTARY_PATH) / 1024
 
     print(f"\n✅ commentary.json 出力完了 ({file_size:.1f} KB)")
     print(f"   マーケットタグ: {market_tags}個")
@@ -87,6 +87,9 @@ def analyze(pf, cm, sd):
     today_trades = [h for h in pf.get("history", []) if h.get("date") == date]
     sold_today = pf.get("sold_today", [])
 
+    # リスク指標（manage_portfolio が daily_nav 追記時に更新したものを読むだけ）
+    risk = pf.get("risk") or {}
+
     # commentary
     market_text = cm.get("market", {}).get("text", cm.get("market", {}).get("comment", ""))
     tags = cm.get("market", {}).get("tags", [])
@@ -100,7 +103,7 @@ def analyze(pf, cm, sd):
         "big_movers": big_movers, "theme_groups": theme_groups,
         "today_trades": today_trades, "sold_today": sold_today,
         "market_text": market_text, "tags": tags, "interview": interview,
-        "holdings": holdings, "positions": positions,
+        "holdings": holdings, "positions": positions, "risk": risk,
     }
 
 
@@ -138,6 +141,8 @@ def gen_note_txt(d):
     lines.append(f"開始来：{fmt_pct(d['pnl'])}")
     lines.append(f"現金：{fmt_yen(d['cash'])}（{d['cash_ratio']:.0f}%）")
     lines.append(f"株式：{fmt_yen(d['stock_value'])}（{100 - d['cash_ratio']:.0f}%）")
+    if d["risk"].get("sharpe") is not None:
+        lines.append(f"最大DD：{d['risk']['max_drawdown_pct']:.2f}%／シャープ：{d['risk']['sharpe']:.2f}")
     lines.append("")
 
     # 保有銘柄
@@ -235,6 +240,9 @@ def gen_note_md(d):
     lines.append(f"| 開始来 | **{fmt_pct(d['pnl'])}** |")
     lines.append(f"| 現金 | {fmt_yen(d['cash'])}（{d['cash_ratio']:.0f}%） |")
     lines.append(f"| 株式 | {fmt_yen(d['stock_value'])}（{100 - d['cash_ratio']:.0f}%） |")
+    if d["risk"].get("sharpe") is not None:
+        lines.append(f"| 最大DD | {d['risk']['max_drawdown_pct']:.2f}% |")
+        lines.append(f"| シャープレシオ | {d['risk']['sharpe']:.2f} |")
     lines.append("")
 
     lines.append(f"## 📦 保有銘柄（{len(d['all_stocks'])}銘柄）")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+html_text.py - HTML → 本文テキストの逐次抽出
+=============================================
+レスポンスを CHUNK_BYTES ずつ読みながら html.parser に流し込む。
+  - script / style / nav / header / footer / aside などの中身は読み飛ばす
+  - <article> / <main> の中の文字を本文として優先（無ければページ全体の可視テキスト）
+  - 必要な文字数が集まった時点で読むのをやめる（巨大ページでも全部は読まない）
+  - collect_links=True なら <a href> と表示テキストも集める（スクレイパー用）
+
+正規表現で全HTMLをなめる方式と違い、バックトラックも全体コピーも起きない。
+
+    text, links = html_text.extract(resp, max_chars=5000)
+"""
+
+import codecs
+from html.parser import HTMLParser
+
+CHUNK_BYTES = 16 * 1024
+MAX_BYTES = 4 * 1024 * 1024   # これ以上は読まない
+MIN_MAIN_CHARS = 200          # article/main の中身がこれ未満なら全体テキストを使う
+BODY_SCAN_FACTOR = 4          # article/main を探すとき、全体テキストを max_chars の何倍まで読むか
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe",
+             "nav", "header", "footer", "aside", "form", "button", "select"}
+MAIN_TAGS = {"article", "main"}
+BLOCK_TAGS = {"p", "div", "br", "li", "ul", "ol", "dl", "dt", "dd", "tr", "td", "th", "table",
+              "section", "article", "main", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre"}
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self, max_chars=5000, prefer_main=True, collect_links=False):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.prefer_main = prefer_main
+        self.collect_links = collect_links
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.body, self.main = [], []
+        self.body_len = self.main_len = 0
+        self.links = []
+        self._link = None  # 読み途中の <a> [href, [テキスト]]
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in MAIN_TAGS:
+            self.main_depth += 1
+        elif tag == "a" and self.collect_links and not self.skip_depth:
+            href = dict(attrs).get("href")
+            self._link = [href, []] if href else None
+        if tag in BLOCK_TAGS:
+            self._sep()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in MAIN_TAGS:
+            self.main_depth = max(0, self.main_depth - 1)
+        elif tag == "a" and self._link:
+            self.links.append((self._link[0], " ".join("".join(self._link[1]).split())))
+            self._link = None
+        if tag in BLOCK_TAGS:
+            self._sep()
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self._link:
+            self._link[1].append(data)
+        n = len(data.strip())
+        if not n:
+            return
+        self.body.append(data)
+        self.body_len += n
+        if self.main_depth:
+            self.main.append(data)
+            self.main_len += n
+        self._check_done()
+
+    def _sep(self):
+        self.body.append(" ")
+        if self.main_depth:
+            self.main.append(" ")
+
+    def _check_done(self):
+        if not self.max_chars:
+            return
+        if self.main_len >= self.max_chars:
+            self.done = True
+        elif not self.prefer_main and self.body_len >= self.max_chars:
+            self.done = True
+        elif self.body_len >= self.max_chars * BODY_SCAN_FACTOR:
+            self.done = True
+
+    def text(self):
+        parts = self.main if self.prefer_main and self.main_len >= MIN_MAIN_CHARS else self.body
+        text = " ".join("".join(parts).split())
+        return text[:self.max_chars] if self.max_chars else text
+
+
+def extract(source, max_chars=5000, prefer_main=True, collect_links=False, charset=None):
+    """HTML（レスポンス/ファイルライク or 文字列）→ (本文テキスト, [(href, リンク文字列), ...])
+
+    max_chars=None なら最後まで読む。charset 省略時はレスポンスヘッダ → utf-8 の順で決める。
+    """
+    parser = TextExtractor(max_chars, prefer_main, collect_links)
+    if isinstance(source, str):
+        parser.feed(source)
+    else:
+        if charset is None:
+            headers = getattr(source, "headers", None)
+            charset = (headers.get_content_charset() if headers is not None else None) or "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(charset)(errors="ignore")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        read = 0
+        while not parser.done and read < MAX_BYTES:
+            chunk = source.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.text(), parser.links
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+http_cache.py - 条件付きGET + 解析結果キャッシュ
+================================================
+ETag / Last-Modified を保存しておき、次回は If-None-Match / If-Modified-Since 付きで取りに行く。
+304 Not Modified なら本文の転送も解析もせず、前回の解析結果をそのまま返す。
+
+キャッシュは .cache/http/<sha1(namespace + URL)>.json に1URL1ファイル:
+  {"etag", "last_modified", "fetched_at", "data"}
+同じURLでも解析方法が違えば namespace を変える（例: "kabutan_news"）。
+
+使い方:
+    items = http_cache.cached_get(url, lambda resp: ET.parse(resp), namespace="rss")
+    text = http_cache.cached_get(url, parse, namespace="article", max_age=7 * 86400)
+parse は urlopen のレスポンス（ファイルライク）を受け取り、JSONにできる値を返すこと。
+"""
+
+import hashlib, json, os, threading, time, urllib.error, urllib.request
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE, ".cache", "http")
+USER_AGENT = "Mozilla/5.0"
+PRUNE_DAYS = 30  # これより古いエントリは prune() で削除
+
+# スクレイパー共通のオープナー（ハンドラ追加やプロキシ設定はここ1か所で）
+OPENER = urllib.request.build_opener()
+
+
+def _path(namespace, url):
+    key = hashlib.sha1(f"{namespace}\n{url}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _save(path, entry):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def cached_get(url, parse, namespace="raw", headers=None, timeout=10, max_age=0):
+    """URLを条件付きGETで取得し、parse(resp) の結果を返す
+
+    max_age: 前回取得からこの秒数以内ならネットワークに出ずにキャッシュを返す
+             （中身が変わらない記事ページ向け。0 なら毎回条件付きGET）
+    取得・解析に失敗した場合は例外をそのまま投げる（キャッシュは更新しない）
+    parse が None を返した場合（本文が取れない・同意画面など）もキャッシュせずに None を返す
+    """
+    path = _path(namespace, url)
+    entry = _load(path)
+    if entry and entry.get("data") is None:
+        entry = None
+    now = time.time()
+    if entry and max_age and now - entry.get("fetched_at", 0) < max_age:
+        return entry["data"]
+
+    req_headers = {"User-Agent": USER_AGENT, **(headers or {})}
+    if entry:
+        if entry.get("etag"):
+            req_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            req_headers["If-Modified-Since"] = entry["last_modified"]
+
+    req = urllib.request.Request(url, headers=req_headers)
+    try:
+        with OPENER.open(req, timeout=timeout) as resp:
+            data = parse(resp)
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not entry:
+            raise
+        entry["fetched_at"] = now
+        _save(path, entry)
+        return entry["data"]
+
+    if data is not None:
+        _save(path, {"etag": etag, "last_modified": last_modified, "fetched_at": now, "data": data})
+    return data
+
+
+def prune(days=PRUNE_DAYS):
+    """しばらく使われていないエントリを削除"""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    cutoff = time.time() - days * 86400
+    removed = 0
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+keyword_matcher.py - 複数キーワードの一括検索（Aho–Corasick法）
+================================================================
+キーワードが何百個あっても、テキストを先頭から1回なめるだけで全部の出現位置が取れる。
+（キーワードごとに re.findall / in を繰り返すと「キーワード数 × テキスト長」かかる）
+
+    m = KeywordMatcher(["日経平均", "日経", "半導体"])
+    for start, end, word in m.finditer(text):
+        ...
+重なった一致（「日経平均」と「日経」など）もすべて返す。
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    def __init__(self, words):
+        self.goto = [{}]     # 状態 → {文字: 次の状態}
+        self.fail = [0]
+        self.out = [[]]      # 状態 → この状態で終わるキーワード
+        for w in dict.fromkeys(words):
+            if w:
+                self._add(w)
+        self._build()
+
+    def _add(self, word):
+        s = 0
+        for ch in word:
+            nxt = self.goto[s].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[s][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            s = nxt
+        self.out[s].append(word)
+
+    def _build(self):
+        q = deque(self.goto[0].values())
+        while q:
+            s = q.popleft()
+            for ch, nxt in self.goto[s].items():
+                q.append(nxt)
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text):
+        """(開始位置, 終了位置, キーワード) を出現順（終了位置順）に返す"""
+        goto, fail, out = self.goto, self.fail, self.out
+        s = 0
+        for i, ch in enumerate(text):
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            for w in out[s]:
+                yield i + 1 - len(w), i + 1, w
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+ledger.py - ポートフォリオ売買台帳（追記専用）
+================================================
+売買とNAVを portfolio_ledger.jsonl に1行ずつ追記し、
+SNAPSHOT_EVERY 件ごとに portfolio_snapshot.json へ集計済みの状態を保存する。
+読み込みは「スナップショット + それ以降の差分」だけを再生するので、
+履歴が何年分たまっても毎日の処理時間は変わらない。
+
+派生ビュー（イベント適用のたびに差分更新）:
+  - positions    : 保有銘柄ごとの株数・取得原価
+  - nav          : 日付 → NAV行（同日の再実行は上書き）
+  - history      : 売買履歴の行
+  - realized_pnl : 実現損益の累計
+
+台帳が正。portfolio.json の cash / daily_nav / history は to_portfolio() で
+台帳の状態から組み立てて書き出す（売買・NAVは必ず append() を通す）。
+"""
+
+import json, os
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+LEDGER_PATH = os.path.join(BASE, "portfolio_ledger.jsonl")
+SNAPSHOT_PATH = os.path.join(BASE, "portfolio_snapshot.json")
+SNAPSHOT_EVERY = 50  # 50イベントごとにスナップショット
+
+
+def empty_state():
+    return {"seq": 0, "cash": 0.0, "positions": {}, "nav": {}, "history": [], "realized_pnl": 0.0}
+
+
+# ══════════════════════════════════════
+# イベント適用（派生ビューの差分更新）
+# ══════════════════════════════════════
+def apply_event(state, ev):
+    """1イベントを状態に反映"""
+    kind = ev.get("type")
+    if kind == "trade":
+        code = ev["code"]
+        pos = state["positions"].setdefault(code, {"name": ev.get("name", ""), "shares": 0, "cost": 0.0})
+        if ev["action"] == "buy":
+            pos["shares"] += ev["shares"]
+            pos["cost"] += ev["amount"]
+            state["cash"] -= ev["amount"]
+        else:
+            avg_cost = pos["cost"] / pos["shares"] if pos["shares"] > 0 else ev["price"]
+            cost_out = avg_cost * ev["shares"]
+            state["realized_pnl"] += ev["amount"] - cost_out
+            pos["shares"] -= ev["shares"]
+            pos["cost"] -= cost_out
+            state["cash"] += ev["amount"]
+            if pos["shares"] <= 0:
+                del state["positions"][code]
+        state["history"].append({
+            "date": ev["date"],
+            "action": ev["action"],
+            "code": code,
+            "name": ev.get("name", ""),
+            "price": ev["price"],
+            "shares": ev["shares"],
+            "amount": round(ev["amount"]),
+            "reason": ev.get("reason", ""),
+        })
+    elif kind == "nav":
+        state["nav"][ev["date"]] = {k: v for k, v in ev.items() if k not in ("type", "seq")}
+    state["seq"] = ev.get("seq", state["seq"] + 1)
+    return state
+
+
+# ══════════════════════════════════════
+# 読み込み / 追記
+# ══════════════════════════════════════
+def _write_snapshot(state, offset):
+    tmp = f"{SNAPSHOT_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"offset": offset, "state": state}, f, ensure_ascii=False)
+    os.replace(tmp, SNAPSHOT_PATH)
+
+
+def _read_snapshot():
+    if not os.path.exists(SNAPSHOT_PATH):
+        return empty_state(), 0
+    with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+        snap = json.load(f)
+    snap["state"].setdefault("history", [])
+    return snap["state"], snap["offset"]
+
+
+def load_state():
+    """スナップショット以降の差分だけ再生して最新状態を返す"""
+    state, offset = _read_snapshot()
+    state["_snapshot_seq"] = state["seq"]
+    if os.path.exists(LEDGER_PATH):
+        with open(LEDGER_PATH, "r", encoding="utf-8") as f:
+            f.seek(offset)
+            for line in iter(f.readline, ""):
+                if line.strip():
+                    apply_event(state, json.loads(line))
+            offset = f.tell()
+    state["_offset"] = offset
+    return state
+
+
+def ensure(pf):
+    """台帳がまだ無ければ portfolio.json の現状から初期スナップショットを作る"""
+    if os.path.exists(SNAPSHOT_PATH) or os.path.exists(LEDGER_PATH):
+        return
+    state = empty_state()
+    state["cash"] = pf.get("cash", 0)
+    for p in pf.get("positions", []):
+        state["positions"][p["code"]] = {
+            "name": p["name"],
+            "shares": p["shares"],
+            "cost": p.get("cost", p["buy_price"] * p["shares"]),
+        }
+    for d in pf.get("daily_nav", []):
+        state["nav"][d["date"]] = d
+    state["history"] = list(pf.get("history", []))
+    _write_snapshot(state, 0)
+    print(f"  📒 台帳を初期化（保有{len(state['positions'])}銘柄 / NAV{len(state['nav'])}日分）")
+
+
+def append(events):
+    """イベントを追記（O(1)）。一定件数ごとにスナップショットを更新"""
+    if not events:
+        return None
+    state = load_state()
+    with open(LEDGER_PATH, "a", encoding="utf-8") as f:
+        for ev in events:
+            ev = {"seq": state["seq"] + 1, **ev}
+            f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+            apply_event(state, ev)
+        offset = f.tell()
+    if state["seq"] - state.pop("_snapshot_seq") >= SNAPSHOT_EVERY:
+        state.pop("_offset", None)
+        _write_snapshot(state, offset)
+    return state
+
+
+def trade_events(sells, buys, date):
+    """manage_portfolio の売買情報 → 台帳イベント"""
+    events = []
+    for t in list(sells) + list(buys):
+        events.append({
+            "type": "trade",
+            "date": date,
+            "action": t["action"],
+            "code": t["code"],
+            "name": t["name"],
+            "price": t["price"],
+            "shares": t["shares"],
+            "amount": t["amount"],
+            "reason": t.get("reason", ""),
+        })
+    return events
+
+
+def nav_event(entry):
+    return {"type": "nav", **entry}
+
+
+# ══════════════════════════════════════
+# 派生ビュー
+# ══════════════════════════════════════
+def nav_series(state):
+    """日付順のNAV行リスト"""
+    return [state["nav"][d] for d in sorted(state["nav"])]
+
+
+def to_portfolio(pf, state):
+    """台帳の状態 → portfolio.json の cash / daily_nav / history を上書き（保有株数のズレは警告）"""
+    pf["cash"] = state["cash"]
+    pf["daily_nav"] = nav_series(state)
+    pf["history"] = list(state["history"])
+    held = {p["code"]: p["shares"] for p in pf.get("positions", [])}
+    booked = {code: p["shares"] for code, p in state["positions"].items()}
+    if held != booked:
+        print(f"  ⚠ 台帳と portfolio.json の保有株数が不一致: 台帳{booked} / portfolio.json{held}")
+    return pf
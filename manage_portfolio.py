@@ -6,9 +6,14 @@
 - 新規銘柄の自動選定
 - daily_nav更新
 - note/X投稿テキスト生成
+- ザラ場監視モード（--monitor）: 場中に損切り・利確ラインを監視
 """
 
-import json, os, sys, datetime, urllib.request, urllib.error, time
+import json, os, sys, datetime, urllib.request, urllib.error, time, asyncio
+
+import execution
+import ledger
+import risk_stats
 
 TODAY = datetime.date.today().strftime("%Y-%m-%d")
 TODAY_SHORT = datetime.date.today().strftime("%Y/%m/%d")
@@ -89,8 +94,11 @@ def load_json(path):
 
 
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
+    """一時ファイルに書いてから置き換え（書き込み途中の壊れたJSONを残さない）"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
 
 
 def update_positions(pf):
@@ -117,53 +125,98 @@ def update_positions(pf):
     return all_ok
 
 
-def check_stop_loss_take_profit(pf):
+# ── 売買ルール（スカラーでも numpy 配列でも動く。backtest_portfolio.py と共用） ──
+def exit_masks(pnl_pct, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT):
+    """損切り・利確の判定 → (損切りか, 利確か)"""
+    stop = pnl_pct <= stop_loss_pct
+    take = (pnl_pct > stop_loss_pct) & (pnl_pct >= take_profit_pct)
+    return stop, take
+
+
+def is_buy_candidate(score, dividend, price, min_score=MIN_SCORE_BUY):
+    """新規買いの基本フィルター: スコア70以上・配当2%以上・価格あり"""
+    return (score >= min_score) & (dividend >= 2.0) & (price > 0)
+
+
+def order_shares(price, cash):
+    """1銘柄の注文株数（100万円上限・残り現金の30%以内・100株単位）。0なら見送り"""
+    max_shares = int((PER_STOCK_MAX // price) // 100 * 100)
+    if max_shares < 100:
+        max_shares = 100
+    if price * max_shares > cash * 0.3:  # 残り現金の30%以上は1銘柄に使わない
+        max_shares = int((int(cash * 0.3) // price) // 100 * 100)
+        if max_shares < 100:
+            return 0
+    return max_shares
+
+
+def exit_signal(pnl_pct):
+    """損切り・利確のルール判定 → "stop_loss" / "take_profit" / None"""
+    stop, take = exit_masks(pnl_pct)
+    if stop:
+        return "stop_loss"
+    if take:
+        return "take_profit"
+    return None
+
+
+def apply_exit(pf, pos, kind, turnover=None):
+    """判定結果を1銘柄に適用。(売却情報 or None, 保有継続するか) を返す
+    約定は execution.fill_order（単元・出来高上限・スリッページ・手数料込み）"""
+    pnl = pos.get("pnl_pct", 0)
+    if kind not in ("stop_loss", "take_profit"):
+        return None, True
+
+    # 損切り: -15%で全株 / 利確: +20%で半分（shares // 2）。どちらも端株のまま約定させる
+    if kind == "stop_loss":
+        sell_qty = pos["shares"]
+    else:
+        sell_qty = int(execution.take_profit_shares(pos["shares"]))
+    fill = execution.fill_order(execution.SELL, pos["current_price"], sell_qty, turnover, odd_lot=True)
+    if fill["filled"] <= 0:
+        return None, True
+
+    if kind == "stop_loss":
+        reason = f"損切り（{pnl:.1f}%）。ルール通りです。"
+    else:
+        reason = f"利確（{pnl:.1f}%）。+20%で半分売却。"
+    if fill["filled"] < sell_qty:
+        reason += f"（出来高上限で{fill['filled']}/{sell_qty}株のみ約定）"
+
+    sell = {
+        "action": "sell",
+        "type": kind,
+        "code": pos["code"],
+        "name": pos["name"],
+        "price": fill["fill_price"],
+        "shares": fill["filled"],
+        "amount": fill["amount"],
+        "fee": fill["fee"],
+        "pnl_pct": pnl,
+        "reason": reason
+    }
+    pf["cash"] += fill["amount"]
+    pos["shares"] -= fill["filled"]
+    pos["cost"] = pos["buy_price"] * pos["shares"]
+    if kind == "stop_loss":
+        print(f"  🔴 損切り: {pos['name']} {pnl:.1f}% → {fill['filled']}株 @¥{fill['fill_price']:,.1f}")
+    else:
+        print(f"  🟢 利確: {pos['name']} {pnl:.1f}% → {fill['filled']}株売却 @¥{fill['fill_price']:,.1f}")
+    return sell, pos["shares"] > 0
+
+
+def check_stop_loss_take_profit(pf, stocks_data=None):
     """損切り・利確判定"""
     sells = []
     remaining = []
+    turnovers = execution.turnover_map(stocks_data)
     
     for pos in pf.get("positions", []):
-        pnl = pos.get("pnl_pct", 0)
-        
-        # 損切り: -15%
-        if pnl <= STOP_LOSS_PCT:
-            sells.append({
-                "action": "sell",
-                "type": "stop_loss",
-                "code": pos["code"],
-                "name": pos["name"],
-                "price": pos["current_price"],
-                "shares": pos["shares"],
-                "amount": pos["current_price"] * pos["shares"],
-                "pnl_pct": pnl,
-                "reason": f"損切り（{pnl:.1f}%）。ルール通りです。"
-            })
-            pf["cash"] += pos["current_price"] * pos["shares"]
-            print(f"  🔴 損切り: {pos['name']} {pnl:.1f}%")
-            
-        # 利確: +20%で半分売却
-        elif pnl >= TAKE_PROFIT_PCT:
-            sell_shares = pos["shares"] // 2
-            if sell_shares > 0:
-                sells.append({
-                    "action": "sell",
-                    "type": "take_profit",
-                    "code": pos["code"],
-                    "name": pos["name"],
-                    "price": pos["current_price"],
-                    "shares": sell_shares,
-                    "amount": pos["current_price"] * sell_shares,
-                    "pnl_pct": pnl,
-                    "reason": f"利確（{pnl:.1f}%）。+20%で半分売却。"
-                })
-                pf["cash"] += pos["current_price"] * sell_shares
-                pos["shares"] -= sell_shares
-                pos["cost"] = pos["buy_price"] * pos["shares"]
-                print(f"  🟢 利確: {pos['name']} {pnl:.1f}% → {sell_shares}株売却")
-                remaining.append(pos)
-            else:
-                remaining.append(pos)
-        else:
+        kind = exit_signal(pos.get("pnl_pct", 0))
+        sell, keep = apply_exit(pf, pos, kind, turnovers.get(pos["code"]))
+        if sell:
+            sells.append(sell)
+        if keep:
             remaining.append(pos)
     
     pf["positions"] = remaining
@@ -196,19 +249,14 @@ def select_new_buys(pf, stocks_data):
         if code in held_codes:
             continue
         
+        # 基本フィルター（スコア・配当2%以上・価格）
         score = s.get("score", 0)
-        if score < MIN_SCORE_BUY:
-            continue
-        
-        # 基本フィルター
         div = s.get("dividend", 0) or 0
         pbr = s.get("pbr", 999) or 999
         rsi = s.get("rsi", 50) or 50
         price = s.get("price", 0) or 0
         
-        if div < 2.0:  # 配当2%未満は除外
-            continue
-        if price <= 0:
+        if not is_buy_candidate(score, div, price):
             continue
             
         candidates.append({
@@ -221,6 +269,7 @@ def select_new_buys(pf, stocks_data):
             "rsi": rsi,
             "sector": s.get("sector", ""),
             "ma25_dev": round((price - (s.get("ma25", price) or price)) / ((s.get("ma25", price) or price) or 1) * 100, 1),
+            "turnover_avg5": s.get("turnover_avg5"),
         })
     
     # スコア順にソート
@@ -232,21 +281,18 @@ def select_new_buys(pf, stocks_data):
         if buy_count >= MAX_BUY_PER_DAY:
             break
         
-        # 1銘柄あたりの投資額を計算（100万円上限）
-        shares_unit = 100  # 基本100株単位
-        invest_amount = c["price"] * shares_unit
-        
-        # 100万円以内で最大株数
-        max_shares = int((PER_STOCK_MAX // c["price"]) // 100 * 100)
-        if max_shares < 100:
-            max_shares = 100
-        invest_amount = c["price"] * max_shares
+        # 1銘柄あたりの株数（100万円上限・残り現金の30%以内）
+        max_shares = order_shares(c["price"], pf["cash"])
+        if max_shares <= 0:
+            continue
         
-        if invest_amount > pf["cash"] * 0.3:  # 残り現金の30%以上は1銘柄に使わない
-            max_shares = int((int(pf["cash"] * 0.3) // c["price"]) // 100 * 100)
-            if max_shares < 100:
-                continue
-            invest_amount = c["price"] * max_shares
+        # 約定シミュレーション（出来高上限で一部約定・スリッページ・手数料）
+        fill = execution.fill_order(execution.BUY, c["price"], max_shares, c["turnover_avg5"])
+        if fill["filled"] < execution.LOT_SIZE:
+            continue
+        max_shares = fill["filled"]
+        fill_price = fill["fill_price"]
+        invest_amount = fill["amount"]
         
         if invest_amount > pf["cash"]:
             continue
@@ -259,9 +305,10 @@ def select_new_buys(pf, stocks_data):
             "action": "buy",
             "code": c["code"],
             "name": c["name"],
-            "price": c["price"],
+            "price": fill_price,
             "shares": max_shares,
             "amount": invest_amount,
+            "fee": fill["fee"],
             "score": c["score"],
             "reason": f"スコア{c['score']}。配当{c['dividend']}%。RSI{c['rsi']}。",
             "type": buy_type
@@ -272,14 +319,14 @@ def select_new_buys(pf, stocks_data):
             "code": c["code"],
             "name": c["name"],
             "buy_date": TODAY,
-            "buy_price": c["price"],
+            "buy_price": fill_price,
             "shares": max_shares,
             "cost": invest_amount,
             "current_price": c["price"],
-            "pnl_pct": 0.0,
+            "pnl_pct": round((c["price"] - fill_price) / fill_price * 100, 2),
             "thesis": buy_info["reason"],
-            "stop_loss": round(c["price"] * (1 + STOP_LOSS_PCT / 100)),
-            "take_profit": round(c["price"] * (1 + TAKE_PROFIT_PCT / 100)),
+            "stop_loss": round(fill_price * (1 + STOP_LOSS_PCT / 100)),
+            "take_profit": round(fill_price * (1 + TAKE_PROFIT_PCT / 100)),
             "type": buy_type
         })
         
@@ -288,7 +335,7 @@ def select_new_buys(pf, stocks_data):
         held_codes.add(c["code"])
         buy_count += 1
         
-        print(f"  🆕 新規購入: {c['name']}({c['code']}) {max_shares}株 @¥{c['price']:,.0f} [{buy_type}]")
+        print(f"  🆕 新規購入: {c['name']}({c['code']}) {max_shares}株 @¥{fill_price:,.1f}（手数料¥{fill['fee']:,}） [{buy_type}]")
     
     return buys
 
@@ -305,16 +352,24 @@ def update_daily_nav(pf, stocks_data):
     pos_value = nav - pf["cash"]
     nikkei = stocks_data.get("nikkei_price", 0)
     
-    # 既に今日のエントリがあれば上書き
-    pf["daily_nav"] = [d for d in pf.get("daily_nav", []) if d["date"] != TODAY]
-    
-    pf["daily_nav"].append({
+    entry = {
         "date": TODAY,
         "nav": round(nav),
         "cash": round(pf["cash"]),
         "positions_value": round(pos_value),
         "nikkei": nikkei
-    })
+    }
+
+    # 既に今日のエントリがあれば上書き（日付順なので末尾だけ見ればよい）
+    daily_nav = pf.setdefault("daily_nav", [])
+    if daily_nav and daily_nav[-1]["date"] == TODAY:
+        daily_nav[-1] = entry
+    else:
+        daily_nav.append(entry)
+
+    # リスク指標を逐次更新（ダッシュボード・日記はこの結果を読む）
+    pf["risk"] = risk_stats.update(entry, daily_nav)
+    return entry
 
 
 # ══════════════════════════════════════
@@ -351,6 +406,10 @@ def generate_note_text(pf, sells, buys, stocks_data, prev_nav_entry):
     # 資産サマリー
     lines.append(f"■ 資産：¥{nav:,.0f}（{pnl_sign}{pnl_pct:.2f}%）")
     lines.append(f"　前日比：{day_sign}¥{day_pnl:,.0f}（{day_sign}{day_pnl_pct:.2f}%）")
+    risk = pf.get("risk") or {}
+    if risk.get("sharpe") is not None:
+        beta = f"｜β {risk['beta']:.2f}" if risk.get("beta") is not None else ""
+        lines.append(f"　最大DD：{risk['max_drawdown_pct']:.2f}%｜シャープ {risk['sharpe']:.2f}{beta}")
     lines.append("")
     
     # 昨日の結果
@@ -584,6 +643,138 @@ def check_human_trigger(pf, sells, buys):
     return None
 
 
+# ══════════════════════════════════════
+# ザラ場監視モード（python3 manage_portfolio.py --monitor）
+# ══════════════════════════════════════
+JST = datetime.timezone(datetime.timedelta(hours=9))
+MONITOR_INTERVAL_SEC = int(os.environ.get("MONITOR_INTERVAL_SEC", "60"))
+TSE_SESSIONS = [((9, 0), (11, 30)), ((12, 30), (15, 30))]  # 前場・後場
+# 監視を終える時刻（HH:MM）。GitHub Actions は1ジョブ6時間までなので前場・後場で分けて起動する
+MONITOR_UNTIL = tuple(int(x) for x in os.environ.get("MONITOR_UNTIL", "15:30").split(":"))
+
+
+def is_tse_open(now):
+    """東証の立会時間中か"""
+    if now.weekday() >= 5:
+        return False
+    hm = (now.hour, now.minute)
+    return any(start <= hm < end for start, end in TSE_SESSIONS)
+
+
+def fetch_prices_batch(codes):
+    """保有銘柄の現在値を1リクエストでまとめて取得 → {code: price}"""
+    if not codes:
+        return {}
+    prices = {}
+    try:
+        import yfinance as yf
+        tickers = [f"{c}.T" for c in codes]
+        data = yf.download(tickers, period="1d", interval="1m", progress=False, threads=False)
+        if data.empty:
+            return prices
+        closes = data["Close"]
+        if not hasattr(closes, "columns"):  # 1銘柄だけのとき Series で返る版がある
+            closes = closes.to_frame(name=tickers[0])
+        for col in closes.columns:
+            series = closes[col].dropna()
+            if not series.empty:
+                prices[str(col).replace(".T", "")] = float(series.iloc[-1])
+    except Exception as e:
+        print(f"  ⚠ 一括株価取得失敗: {e}")
+    return prices
+
+
+def build_monitor_state(pf):
+    """判定用の状態（買値・直近値・判定済みか）をメモリに持つ"""
+    return {
+        p["code"]: {"buy_price": p["buy_price"], "last": p.get("current_price", p["buy_price"]), "checked": False}
+        for p in pf.get("positions", [])
+        if p.get("buy_price", 0) > 0
+    }
+
+
+def evaluate_tick(state, prices, fired):
+    """ルール判定 → [(code, kind, price)]
+    初回は全銘柄を判定（始値の時点でもうラインを割っている銘柄も拾う）、2回目以降は値が動いた銘柄だけ"""
+    fires = []
+    for code, price in prices.items():
+        st = state.get(code)
+        if st is None or price <= 0 or (st["checked"] and price == st["last"]):
+            continue
+        # 異常値ガード（update_positions と同じ基準）
+        if st["last"] > 0 and (price < st["last"] * 0.5 or price > st["last"] * 2.0):
+            continue
+        st["last"], st["checked"] = price, True
+        pnl = round((price - st["buy_price"]) / st["buy_price"] * 100, 2)
+        kind = exit_signal(pnl)
+        if kind and (code, kind) not in fired:
+            fired.add((code, kind))
+            fires.append((code, kind, price))
+    return fires
+
+
+def commit_intraday_exits(fires, now):
+    """発火した売却だけ portfolio.json に反映（最新を読み直してから原子的に保存）"""
+    pf = load_json(PF_PATH)
+    ledger.ensure(pf)
+    turnovers = execution.turnover_map(load_json(STOCKS_PATH) if os.path.exists(STOCKS_PATH) else {})
+    by_code = {p["code"]: p for p in pf.get("positions", [])}
+    sells = []
+    closed = set()
+    for code, kind, price in fires:
+        pos = by_code.get(code)
+        if not pos:
+            continue
+        pos["current_price"] = price
+        pos["pnl_pct"] = round((price - pos["buy_price"]) / pos["buy_price"] * 100, 2)
+        sell, keep = apply_exit(pf, pos, kind, turnovers.get(code))
+        if sell:
+            sell["reason"] += f"（場中 {now.strftime('%H:%M')}）"
+            sells.append(sell)
+        if not keep:
+            closed.add(code)
+    if not sells:
+        return sells
+    pf["positions"] = [p for p in pf["positions"] if p["code"] not in closed]
+    state = ledger.append(ledger.trade_events(sells, [], now.strftime("%Y-%m-%d")))
+    save_json(PF_PATH, ledger.to_portfolio(pf, state))
+    return sells
+
+
+async def monitor_loop(interval=MONITOR_INTERVAL_SEC, until=MONITOR_UNTIL):
+    """場中は interval 秒ごとに保有銘柄を一括取得し、ルールに触れた時だけ書き込む"""
+    print(f"👀 ザラ場監視開始（{interval}秒間隔、{until[0]}:{until[1]:02d}まで）")
+    state, pf_mtime, fired = {}, None, set()
+    while True:
+        now = datetime.datetime.now(JST)
+        if now.weekday() >= 5 or (now.hour, now.minute) >= min(until, TSE_SESSIONS[-1][1]):
+            print("🔔 監視終了")
+            return
+        if not is_tse_open(now):
+            await asyncio.sleep(interval)
+            continue
+
+        # 日次ジョブ等が portfolio.json を書き換えた時だけ状態を作り直す
+        mtime = os.stat(PF_PATH).st_mtime
+        if mtime != pf_mtime:
+            state = build_monitor_state(load_json(PF_PATH))
+            pf_mtime = mtime
+
+        prices = await asyncio.to_thread(fetch_prices_batch, list(state))
+        fires = evaluate_tick(state, prices, fired)
+        if fires:
+            sells = commit_intraday_exits(fires, now)
+            pf_mtime = None  # 株数が変わったので次回ポーリングで状態を作り直す
+            if sells:
+                lines = [f"⏰ **場中アラート**（{now.strftime('%H:%M')}）"]
+                for s in sells:
+                    emoji = "🔴" if s["type"] == "stop_loss" else "🟢"
+                    label = "損切り" if s["type"] == "stop_loss" else "利確"
+                    lines.append(f"{emoji} {label}: {s['name']} {s['shares']}株 @¥{s['price']:,.0f}（{s['pnl_pct']:+.1f}%）")
+                send_discord("\n".join(lines))
+        await asyncio.sleep(interval)
+
+
 # ══════════════════════════════════════
 # MAIN
 # ══════════════════════════════════════
@@ -603,6 +794,7 @@ def main():
         sys.exit(1)
     
     pf = load_json(PF_PATH)
+    ledger.ensure(pf)
     
     stocks_data = {}
     if os.path.exists(STOCKS_PATH):
@@ -620,7 +812,7 @@ def main():
     buys = []
     if prices_ok:
         print("\n📋 損切り・利確チェック...")
-        sells = check_stop_loss_take_profit(pf)
+        sells = check_stop_loss_take_profit(pf, stocks_data)
         if not sells:
             print("  → 該当なし")
         
@@ -633,36 +825,13 @@ def main():
         print("\n⚠ 株価データに異常あり → 売買判断スキップ（安全モード）")
     
     # ④ daily_nav更新
-    update_daily_nav(pf, stocks_data)
-    
-    # ⑤ 売買履歴に追加
-    history = pf.get("history", [])
-    for s in sells:
-        history.append({
-            "date": TODAY,
-            "action": "sell",
-            "code": s["code"],
-            "name": s["name"],
-            "price": s["price"],
-            "shares": s["shares"],
-            "amount": round(s["amount"]),
-            "reason": s["reason"]
-        })
-    for b in buys:
-        history.append({
-            "date": TODAY,
-            "action": "buy",
-            "code": b["code"],
-            "name": b["name"],
-            "price": b["price"],
-            "shares": b["shares"],
-            "amount": round(b["amount"]),
-            "reason": b["reason"]
-        })
-    pf["history"] = history
+    nav_entry = update_daily_nav(pf, stocks_data)
     
-    # ⑥ portfolio.json保存
-    save_json(PF_PATH, pf)
+    # ⑤ 台帳に今日の売買とNAVを追記（台帳が正）
+    state = ledger.append(ledger.trade_events(sells, buys, TODAY) + [ledger.nav_event(nav_entry)])
+
+    # ⑥ portfolio.json保存（cash / daily_nav / history は台帳から組み立てる）
+    save_json(PF_PATH, ledger.to_portfolio(pf, state))
     print(f"\n✅ portfolio.json 更新完了")
     
     # ⑦ NAVサマリー
@@ -673,6 +842,7 @@ def main():
     print(f"💰 NAV: ¥{nav:,.0f} ({'+' if pnl>=0 else ''}{pnl_pct:.2f}%)")
     print(f"💴 現金: ¥{pf['cash']:,.0f}")
     print(f"📊 保有: {len(pf['positions'])}銘柄")
+    print(f"💹 実現損益: ¥{state['realized_pnl']:,.0f}")
     print(f"{'='*50}")
     
     # ⑧ 記事テキスト生成
@@ -693,4 +863,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--monitor" in sys.argv:
+        asyncio.run(monitor_loop())
+    else:
+        main()
@@ -3,65 +3,175 @@
 market_intelligence.py - 市場インテリジェンス収集
 Phase 1: note トレンド / 日経見出し / VIX恐怖指数
 
+各情報源は独立した収集関数（ソース）で、それぞれデーモンスレッドで同時に実行する。
+  - ソースごとの持ち時間（SOURCE_TIMEOUTS）を過ぎたら、そのソースは打ち切り
+  - 全体の期限（GLOBAL_DEADLINE_SEC）を過ぎたら、終わったソースだけで保存
+    （応答しないソースのスレッドは置き去りにする。デーモンなのでプロセスは期限どおりに終わる）
+  - ソースが1つ終わるたびに market_intelligence.json を書き出す（途中結果の公開）
+→ 所要時間は「全ソースの合計」ではなく「一番遅いソース」で決まる。
+
+RSS / 株探 は http_cache 経由の条件付きGET（変化がなければ304で解析もしない）。
+TDnet は tdnet.py で1日分の全ページを差分取り込み。
+
+import しても何も実行しない。各 collect_* は単独でも呼べる（deadline 省略可）:
+    import market_intelligence as mi
+    headlines = mi.collect_nikkei_headlines()
+    result = mi.collect(publish_path=None)   # 全ソース（ファイルには書かない）
+
 出力: market_intelligence.json
 """
 
-import json, urllib.request, datetime, xml.etree.ElementTree as ET
+import json, os, queue, threading, time, datetime, urllib.request, urllib.parse, xml.etree.ElementTree as ET
+from typing import Optional, TypedDict
+
+import html_text
+import http_cache
+import minkabu
+import tdnet
+import tradingview
 
 JST = datetime.timezone(datetime.timedelta(hours=9))
-NOW = datetime.datetime.now(JST)
-DATE_STR = NOW.strftime("%Y-%m-%d")
-
-result = {
-    "date": DATE_STR,
-    "updated_at": NOW.strftime("%Y-%m-%d %H:%M JST"),
-    "note_trends": [],
-    "nikkei_headlines": [],
-    "fear_greed": {},
-    "kabutan_news": [],
-    "tradingview_signals": [],
-    "yahoo_board": [],
-    "tdnet_disclosures": [],
-    "google_news": []
+
+OUTPUT_PATH = "market_intelligence.json"
+REQUEST_TIMEOUT = 10       # 1リクエストの上限（秒）
+GLOBAL_DEADLINE_SEC = 40   # 全体の期限（秒）
+SOURCE_TIMEOUTS = {        # ソースごとの持ち時間（秒）
+    "note_trends": 20,
+    "nikkei_headlines": 15,
+    "fear_greed": 5,
+    "kabutan_news": 15,
+    "tradingview_signals": 15,
+    "yahoo_board": 30,
+    "tdnet_disclosures": 30,  # 全ページをたどるので長め
+    "google_news": 15,
 }
 
+
+# ─── 結果の型 ───
+class NoteTrend(TypedDict):
+    title: str
+    author: str
+    likes: int
+    price: int
+    tag: str
+    url: str
+
+
+class Headline(TypedDict):
+    category: str
+    title: str
+    url: str
+    date: str
+
+
+class FearGreed(TypedDict):
+    vix: Optional[float]
+    score: int
+    rating: str
+    rating_jp: str
+
+
+class NewsLink(TypedDict):
+    title: str
+    url: str
+
+
+class TradingViewSignal(TypedDict):
+    code: str
+    score: float
+    signal_jp: str
+    ma_score: float
+    osc_score: float
+
+
+class MinkabuRating(TypedDict, total=False):
+    code: str
+    source: str
+    target_price: Optional[str]
+    individual_rating: Optional[str]
+    analyst_rating: Optional[str]
+    error: str
+
+
+class Disclosure(TypedDict):
+    code: str
+    name: str
+    time: str
+    title: str
+    url: str
+
+
+class GoogleNews(TypedDict):
+    title: str
+    url: str
+    published: str
+
+
+class MarketIntelligence(TypedDict, total=False):
+    date: str
+    updated_at: str
+    note_trends: list[NoteTrend]
+    nikkei_headlines: list[Headline]
+    fear_greed: FearGreed
+    kabutan_news: list[NewsLink]
+    tradingview_signals: list[TradingViewSignal]
+    yahoo_board: list[MinkabuRating]
+    tdnet_disclosures: list[Disclosure]
+    google_news: list[GoogleNews]
+    pending_sources: list[str]
+
+
+def time_left(deadline):
+    """ソースの残り持ち時間（1リクエストの timeout に使う）。deadline=None なら上限そのまま"""
+    if deadline is None:
+        return REQUEST_TIMEOUT
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("持ち時間切れ")
+    return min(left, REQUEST_TIMEOUT)
+
+
+def open_url(url, deadline, data=None, headers=None):
+    """ソースの残り持ち時間を timeout にして開く"""
+    req = urllib.request.Request(url, data=data, headers={"User-Agent": "Mozilla/5.0", **(headers or {})})
+    return http_cache.OPENER.open(req, timeout=time_left(deadline))
+
+
 # ─── 1. note トレンド（#日本株 + #株式投資） ───
-print("📝 note トレンド収集中...")
 NOTE_TAGS = ["日本株", "株式投資", "日経平均", "高配当"]
-seen_keys = set()
 
-for tag in NOTE_TAGS:
-    try:
-        url = f"https://note.com/api/v3/hashtags/{urllib.parse.quote(tag)}/notes?page=1&sort=like"
-        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read())
-        for n in data.get("data", {}).get("notes", [])[:10]:
-            key = n.get("key", "")
-            if key in seen_keys:
-                continue
-            seen_keys.add(key)
-            price = n.get("price", 0) or 0
-            likes = n.get("like_count", 0) or 0
-            result["note_trends"].append({
-                "title": n.get("name", "")[:80],
-                "author": n.get("user", {}).get("nickname", "")[:30],
-                "likes": likes,
-                "price": price,
-                "tag": tag,
-                "url": f"https://note.com/{n.get('user',{}).get('urlname','')}/n/{key}"
-            })
-    except Exception as e:
-        print(f"  ⚠ #{tag} 取得失敗: {e}")
 
-# いいね数でソートして上位20件に絞る
-result["note_trends"].sort(key=lambda x: x["likes"], reverse=True)
-result["note_trends"] = result["note_trends"][:20]
-print(f"  ✅ {len(result['note_trends'])}件取得")
+def collect_note_trends(deadline=None) -> list[NoteTrend]:
+    trends, seen_keys = [], set()
+    for tag in NOTE_TAGS:
+        try:
+            url = f"https://note.com/api/v3/hashtags/{urllib.parse.quote(tag)}/notes?page=1&sort=like"
+            with open_url(url, deadline) as resp:
+                data = json.loads(resp.read())
+            for n in data.get("data", {}).get("notes", [])[:10]:
+                key = n.get("key", "")
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+                price = n.get("price", 0) or 0
+                likes = n.get("like_count", 0) or 0
+                trends.append({
+                    "title": n.get("name", "")[:80],
+                    "author": n.get("user", {}).get("nickname", "")[:30],
+                    "likes": likes,
+                    "price": price,
+                    "tag": tag,
+                    "url": f"https://note.com/{n.get('user',{}).get('urlname','')}/n/{key}"
+                })
+        except Exception as e:
+            print(f"  ⚠ #{tag} 取得失敗: {e}")
+
+    # いいね数でソートして上位20件に絞る
+    trends.sort(key=lambda x: x["likes"], reverse=True)
+    return trends[:20]
 
 
 # ─── 2. 日経ニュース見出し（RSS） ───
-print("📰 日経見出し収集中...")
 NIKKEI_FEEDS = [
     ("総合", "https://assets.wor.jp/rss/rdf/nikkei/news.rdf"),
     ("国際", "https://assets.wor.jp/rss/rdf/nikkei/international.rdf"),
@@ -69,248 +179,287 @@ NIKKEI_FEEDS = [
 ]
 NS = {"rss": "http://purl.org/rss/1.0/", "dc": "http://purl.org/dc/elements/1.1/"}
 
-for cat, feed_url in NIKKEI_FEEDS:
-    try:
-        req = urllib.request.Request(feed_url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            tree = ET.parse(resp)
-        for item in list(tree.findall(".//rss:item", NS))[:5]:
-            title = item.find("rss:title", NS)
-            link = item.find("rss:link", NS)
-            date = item.find("dc:date", NS)
-            if title is not None:
-                result["nikkei_headlines"].append({
-                    "category": cat,
-                    "title": title.text[:80] if title.text else "",
-                    "url": link.text if link is not None and link.text else "",
-                    "date": date.text if date is not None and date.text else ""
-                })
-    except Exception as e:
-        print(f"  ⚠ {cat} 取得失敗: {e}")
 
-print(f"  ✅ {len(result['nikkei_headlines'])}件取得")
+def parse_nikkei_feed(resp):
+    items = []
+    for item in list(ET.parse(resp).findall(".//rss:item", NS))[:5]:
+        title = item.find("rss:title", NS)
+        link = item.find("rss:link", NS)
+        date = item.find("dc:date", NS)
+        if title is not None:
+            items.append({
+                "title": title.text[:80] if title.text else "",
+                "url": link.text if link is not None and link.text else "",
+                "date": date.text if date is not None and date.text else ""
+            })
+    return items
+
+
+def collect_nikkei_headlines(deadline=None) -> list[Headline]:
+    headlines = []
+    for cat, feed_url in NIKKEI_FEEDS:
+        try:
+            items = http_cache.cached_get(feed_url, parse_nikkei_feed, namespace="nikkei_rss",
+                                          timeout=time_left(deadline))
+            headlines += [{"category": cat, **h} for h in items]
+        except Exception as e:
+            print(f"  ⚠ {cat} 取得失敗: {e}")
+    return headlines
 
 
 # ─── 3. VIXベース恐怖指数 ───
-print("😱 VIX恐怖指数計算中...")
-try:
-    # stocks_data.json からVIXを読む（既にfetch_stocks.pyで取得済み）
-    with open("stocks_data.json", "r") as f:
-        stocks = json.load(f)
-    vix = stocks.get("vix", 20)
-
-    # VIXから恐怖/強欲を判定
-    # VIX < 12: Extreme Greed
-    # VIX 12-17: Greed
-    # VIX 17-22: Neutral
-    # VIX 22-30: Fear
-    # VIX > 30: Extreme Fear
-    if vix < 12:
-        rating, score = "Extreme Greed", 85
-    elif vix < 17:
-        rating, score = "Greed", 70
-    elif vix < 22:
-        rating, score = "Neutral", 50
-    elif vix < 30:
-        rating, score = "Fear", 30
-    else:
-        rating, score = "Extreme Fear", 10
-
-    result["fear_greed"] = {
-        "vix": vix,
-        "score": score,
-        "rating": rating,
-        "rating_jp": {
-            "Extreme Greed": "極度の強欲",
-            "Greed": "強欲",
-            "Neutral": "中立",
-            "Fear": "恐怖",
-            "Extreme Fear": "極度の恐怖"
-        }.get(rating, "不明")
-    }
-    print(f"  ✅ VIX={vix} → {rating}（{score}pt）")
-except Exception as e:
-    print(f"  ⚠ VIX取得失敗: {e}")
-    result["fear_greed"] = {"vix": None, "score": 50, "rating": "Unknown", "rating_jp": "不明"}
+def collect_fear_greed(deadline=None) -> FearGreed:
+    try:
+        # stocks_data.json からVIXを読む（既にfetch_stocks.pyで取得済み）
+        with open("stocks_data.json", "r") as f:
+            stocks = json.load(f)
+        vix = stocks.get("vix", 20)
+
+        # VIXから恐怖/強欲を判定
+        # VIX < 12: Extreme Greed
+        # VIX 12-17: Greed
+        # VIX 17-22: Neutral
+        # VIX 22-30: Fear
+        # VIX > 30: Extreme Fear
+        if vix < 12:
+            rating, score = "Extreme Greed", 85
+        elif vix < 17:
+            rating, score = "Greed", 70
+        elif vix < 22:
+            rating, score = "Neutral", 50
+        elif vix < 30:
+            rating, score = "Fear", 30
+        else:
+            rating, score = "Extreme Fear", 10
+
+        return {
+            "vix": vix,
+            "score": score,
+            "rating": rating,
+            "rating_jp": {
+                "Extreme Greed": "極度の強欲",
+                "Greed": "強欲",
+                "Neutral": "中立",
+                "Fear": "恐怖",
+                "Extreme Fear": "極度の恐怖"
+            }.get(rating, "不明")
+        }
+    except Exception as e:
+        print(f"  ⚠ VIX取得失敗: {e}")
+        return {"vix": None, "score": 50, "rating": "Unknown", "rating_jp": "不明"}
 
 
 # ─── 4. 株探ニュース ───
-print("📰 株探ニュース収集中...")
-try:
-    import re
-    req = urllib.request.Request("https://kabutan.jp/news/", headers={"User-Agent": "Mozilla/5.0"})
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        html = resp.read().decode("utf-8", errors="ignore")
-    titles = re.findall(r'<a[^>]*href="(/news/[^"]+)"[^>]*>([^<]{15,80})</a>', html)
+def parse_kabutan_news(resp):
+    news = []
+    _, links = html_text.extract(resp, max_chars=None, prefer_main=False, collect_links=True)
     seen = set()
-    for url_path, title in titles:
-        title = title.strip()
-        if title not in seen and len(title) > 15:
+    for href, title in links:
+        url_path = href.replace("https://kabutan.jp", "")
+        if not url_path.startswith("/news/"):
+            continue
+        if title not in seen and 15 < len(title) <= 80:
             seen.add(title)
-            result["kabutan_news"].append({
+            news.append({
                 "title": title[:80],
                 "url": f"https://kabutan.jp{url_path}"
             })
-            if len(result["kabutan_news"]) >= 10:
+            if len(news) >= 10:
                 break
-    print(f"  ✅ {len(result['kabutan_news'])}件取得")
-except Exception as e:
-    print(f"  ⚠ 株探取得失敗: {e}")
+    return news
+
+
+def collect_kabutan_news(deadline=None) -> list[NewsLink]:
+    return http_cache.cached_get("https://kabutan.jp/news/", parse_kabutan_news,
+                                 namespace="kabutan_links", timeout=time_left(deadline))
 
 
 # ─── 5. TradingView テクニカルシグナル ───
-print("📊 TradingView シグナル収集中...")
-try:
-    tickers = ["TSE:4676", "TSE:7270", "TSE:4331", "TSE:7172", "TSE:2181", "TSE:3668"]
-    try:
-        with open("stocks_data.json", "r") as f:
-            sd = json.load(f)
-        top_codes = sorted(
-            [s for s in sd.get("stocks", []) if s.get("market_cap_b", 0) > 0],
-            key=lambda s: s.get("market_cap_b", 0),
-            reverse=True
-        )[:10]
-        for s in top_codes:
-            t = f"TSE:{s['code']}"
-            if t not in tickers:
-                tickers.append(t)
-    except:
-        pass
-
-    payload = json.dumps({
-        "symbols": {"tickers": tickers, "query": {"types": []}},
-        "columns": ["Recommend.All", "Recommend.MA", "Recommend.Other"]
-    }).encode("utf-8")
-
-    req = urllib.request.Request(
-        "https://scanner.tradingview.com/japan/scan",
-        data=payload,
-        headers={"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"}
-    )
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        tv_data = json.loads(resp.read())
-
-    for item in tv_data.get("data", []):
-        symbol = item.get("s", "").replace("TSE:", "")
-        vals = item.get("d", [0, 0, 0])
-        score = vals[0] if vals[0] else 0
-        if score >= 0.5:
-            signal_jp = "強い買い"
-        elif score >= 0.1:
-            signal_jp = "買い"
-        elif score >= -0.1:
-            signal_jp = "中立"
-        elif score >= -0.5:
-            signal_jp = "売り"
-        else:
-            signal_jp = "強い売り"
-        result["tradingview_signals"].append({
-            "code": symbol,
-            "score": round(score, 3),
-            "signal_jp": signal_jp,
-            "ma_score": round(vals[1], 3) if vals[1] else 0,
-            "osc_score": round(vals[2], 3) if vals[2] else 0
-        })
-    print(f"  ✅ {len(result['tradingview_signals'])}銘柄取得")
-except Exception as e:
-    print(f"  ⚠ TradingView取得失敗: {e}")
+def collect_tradingview_signals(deadline=None) -> list[TradingViewSignal]:
+    """stocks_data.json の全銘柄を tradingview.py でまとめて取得"""
+    with open("stocks_data.json", "r") as f:
+        codes = [s["code"] for s in json.load(f).get("stocks", [])]
+    tv = tradingview.fetch_recommendations(codes, timeout=time_left(deadline))
+    signals = [{
+        "code": code,
+        "score": v["tv_all"] or 0,
+        "signal_jp": tradingview.signal_jp(v["tv_all"]),
+        "ma_score": v["tv_ma"] or 0,
+        "osc_score": v["tv_osc"] or 0
+    } for code, v in tv.items()]
+    signals.sort(key=lambda x: x["score"], reverse=True)
+    return signals
 
 
 # ─── 6. みんかぶ 個人投資家予想 ───
-print("💬 みんかぶ予想収集中...")
-import re as re_mod
-MINKABU_CODES = ["4676", "7270", "4331", "7172", "2181", "3668"]
-for code in MINKABU_CODES:
+def collect_minkabu(deadline=None) -> list[MinkabuRating]:
+    """保有銘柄 + スコア上位を minkabu.py で並列取得（銘柄ごとにTTLキャッシュ）"""
+    with open("stocks_data.json", "r") as f:
+        sd = json.load(f)
     try:
-        url = f"https://minkabu.jp/stock/{code}"
-        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            html = resp.read().decode("utf-8", errors="ignore")
-        target = re_mod.findall(r'(?:目標株価|理論株価)[^0-9]*?([0-9,]{3,8})\s*円', html)
-        individual = re_mod.findall(r'個人投資家[^買売中]*?(買い|売り|中立)', html)
-        analyst = re_mod.findall(r'アナリスト[^買売中]*?(買い|売り|中立)', html)
-        result["yahoo_board"].append({
-            "code": code,
-            "source": "minkabu",
-            "target_price": target[0] if target else None,
-            "individual_rating": individual[0] if individual else None,
-            "analyst_rating": analyst[0] if analyst else None
-        })
-    except Exception as e:
-        result["yahoo_board"].append({"code": code, "error": str(e)[:50]})
-print(f"  ✅ {len(result['yahoo_board'])}銘柄取得")
+        with open("portfolio.json", "r", encoding="utf-8") as f:
+            pf = json.load(f)
+    except Exception:
+        pf = None
+    return minkabu.collect(minkabu.target_codes(sd, pf), deadline=deadline)
 
 
 # ─── 7. TDnet 適時開示 ───
-print("📋 TDnet適時開示収集中...")
-try:
-    import re as re_td
-    today_str = NOW.strftime("%Y%m%d")
-    url = f"https://www.release.tdnet.info/inbs/I_list_001_{today_str}.html"
-    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        html = resp.read().decode("utf-8", errors="ignore")
-    links = re_td.findall(r'href="([^"]+\.pdf)"[^>]*>([^<]+)<', html)
-    keywords = ["決算", "業績", "配当", "修正", "株式", "自己株", "買付", "合併", "分割", "増資"]
-    for url_path, title in links:
-        title = title.strip()
-        if len(title) > 10 and any(k in title for k in keywords):
-            result["tdnet_disclosures"].append({
-                "title": title[:80],
-                "url": f"https://www.release.tdnet.info/inbs/{url_path}"
+TDNET_KEYWORDS = ["決算", "業績", "配当", "修正", "株式", "自己株", "買付", "合併", "分割", "増資"]
+
+
+def collect_tdnet(deadline=None) -> list[Disclosure]:
+    """1日分の全ページを差分取り込み（tdnet.py）→ 重要そうな開示を表示用に抽出"""
+    items = tdnet.ingest(deadline=deadline)
+    disclosures = []
+    for d in items:
+        if len(d["title"]) > 10 and any(k in d["title"] for k in TDNET_KEYWORDS):
+            disclosures.append({
+                "code": d["code"],
+                "name": d["name"],
+                "time": d["time"],
+                "title": d["title"][:80],
+                "url": d["url"]
             })
-            if len(result["tdnet_disclosures"]) >= 15:
+            if len(disclosures) >= 15:
                 break
-    print(f"  ✅ {len(result['tdnet_disclosures'])}件取得（全{len(links)}件中）")
-except Exception as e:
-    print(f"  ⚠ TDnet取得失敗: {e}")
+    print(f"  📋 TDnet: 全{len(items)}件中{len(disclosures)}件")
+    return disclosures
 
 
 # ─── 8. Google News（日本株関連） ───
-print("📰 Google News収集中...")
 GNEWS_QUERIES = [
     "%E6%97%A5%E6%9C%AC%E6%A0%AA",
     "%E6%97%A5%E7%B5%8C%E5%B9%B3%E5%9D%87",
 ]
-seen_titles = set()
-for q in GNEWS_QUERIES:
-    try:
-        url = f"https://news.google.com/rss/search?q={q}&hl=ja&gl=JP&ceid=JP:ja"
-        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            tree = ET.parse(resp)
-        for item in list(tree.findall(".//item"))[:10]:
-            title_el = item.find("title")
-            link_el = item.find("link")
-            pub_el = item.find("pubDate")
-            if title_el is not None and title_el.text:
-                t = title_el.text.strip()[:80]
-                if t not in seen_titles:
-                    seen_titles.add(t)
-                    result["google_news"].append({
-                        "title": t,
-                        "url": link_el.text if link_el is not None else "",
-                        "published": pub_el.text if pub_el is not None else ""
-                    })
-    except Exception as e:
-        print(f"  ⚠ Google News取得失敗: {e}")
-result["google_news"] = result["google_news"][:15]
-print(f"  ✅ {len(result['google_news'])}件取得")
-
-
-# ─── 保存 ───
-with open("market_intelligence.json", "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=2)
-
-# 日付別アーカイブ保存
-import os
-os.makedirs("intelligence_data", exist_ok=True)
-archive_path = f"intelligence_data/{DATE_STR}.json"
-with open(archive_path, "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=2)
-print(f"📁 アーカイブ保存: {archive_path}")
-
-print(f"\n🎉 market_intelligence.json 保存完了！")
-print(f"   note: {len(result['note_trends'])}件")
-print(f"   日経: {len(result['nikkei_headlines'])}件")
-print(f"   恐怖指数: {result['fear_greed'].get('rating_jp', '不明')}")
+
+
+def parse_google_news(resp):
+    items = []
+    for item in list(ET.parse(resp).findall(".//item"))[:10]:
+        title_el = item.find("title")
+        link_el = item.find("link")
+        pub_el = item.find("pubDate")
+        if title_el is not None and title_el.text:
+            items.append({
+                "title": title_el.text.strip()[:80],
+                "url": link_el.text if link_el is not None else "",
+                "published": pub_el.text if pub_el is not None else ""
+            })
+    return items
+
+
+def collect_google_news(deadline=None) -> list[GoogleNews]:
+    news, seen_titles = [], set()
+    for q in GNEWS_QUERIES:
+        try:
+            url = f"https://news.google.com/rss/search?q={q}&hl=ja&gl=JP&ceid=JP:ja"
+            items = http_cache.cached_get(url, parse_google_news, namespace="google_news",
+                                          timeout=time_left(deadline))
+            for n in items:
+                if n["title"] not in seen_titles:
+                    seen_titles.add(n["title"])
+                    news.append(n)
+        except Exception as e:
+            print(f"  ⚠ Google News取得失敗: {e}")
+    return news[:15]
+
+
+# (出力キー, 表示名, 収集関数)
+SOURCES = [
+    ("note_trends", "📝 note トレンド", collect_note_trends),
+    ("nikkei_headlines", "📰 日経見出し", collect_nikkei_headlines),
+    ("fear_greed", "😱 VIX恐怖指数", collect_fear_greed),
+    ("kabutan_news", "📰 株探ニュース", collect_kabutan_news),
+    ("tradingview_signals", "📊 TradingView シグナル", collect_tradingview_signals),
+    ("yahoo_board", "💬 みんかぶ予想", collect_minkabu),
+    ("tdnet_disclosures", "📋 TDnet適時開示", collect_tdnet),
+    ("google_news", "📰 Google News", collect_google_news),
+]
+
+
+# ─── 実行 & 保存 ───
+def save_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run_sources(result, deadline_sec=GLOBAL_DEADLINE_SEC, publish_path=OUTPUT_PATH):
+    """全ソースを同時に実行。終わった順に result へ反映し、publish_path へ途中結果を書き出す
+    ソースはデーモンスレッドで動かす（期限切れで応答しないソースがあってもプロセスの終了を待たせない）"""
+    start = time.monotonic()
+    done = queue.Queue()
+
+    def run(key, func):
+        try:
+            done.put((key, func(start + SOURCE_TIMEOUTS.get(key, REQUEST_TIMEOUT)), None))
+        except Exception as e:
+            done.put((key, None, e))
+
+    names = {key: name for key, name, _ in SOURCES}
+    for key, _, func in SOURCES:
+        threading.Thread(target=run, args=(key, func), name=f"source-{key}", daemon=True).start()
+    pending = set(names)
+    while pending:
+        try:
+            key, value, err = done.get(timeout=max(0.0, start + deadline_sec - time.monotonic()))
+        except queue.Empty:
+            print(f"  ⏱ 全体期限{deadline_sec}秒 → 未完了のまま保存: {', '.join(names[k] for k in names if k in pending)}")
+            break
+        pending.discard(key)
+        if err is None:
+            result[key] = value
+            n = len(value) if isinstance(value, list) else 1
+            print(f"  ✅ {names[key]}: {n}件（{time.monotonic() - start:.1f}秒）")
+        else:
+            print(f"  ⚠ {names[key]} 取得失敗: {err}")
+        result["pending_sources"] = sorted(pending)
+        if publish_path:
+            save_json(publish_path, result)
+    result["pending_sources"] = sorted(pending)
+    return result
+
+
+def collect(deadline_sec=GLOBAL_DEADLINE_SEC, publish_path=OUTPUT_PATH) -> MarketIntelligence:
+    """全ソースを収集して結果を返す（publish_path=None ならファイルに書かない）"""
+    now = datetime.datetime.now(JST)
+    result: MarketIntelligence = {
+        "date": now.strftime("%Y-%m-%d"),
+        "updated_at": now.strftime("%Y-%m-%d %H:%M JST"),
+        "note_trends": [],
+        "nikkei_headlines": [],
+        "fear_greed": {},
+        "kabutan_news": [],
+        "tradingview_signals": [],
+        "yahoo_board": [],
+        "tdnet_disclosures": [],
+        "google_news": []
+    }
+
+    print(f"🧠 {len(SOURCES)}ソースを同時収集中...")
+    run_sources(result, deadline_sec, publish_path)
+    if publish_path:
+        save_json(publish_path, result)
+    return result
+
+
+def main():
+    result = collect()
+
+    # 日付別アーカイブ保存
+    os.makedirs("intelligence_data", exist_ok=True)
+    archive_path = f"intelligence_data/{result['date']}.json"
+    save_json(archive_path, result)
+    print(f"📁 アーカイブ保存: {archive_path}")
+    http_cache.prune()
+
+    print(f"\n🎉 market_intelligence.json 保存完了！")
+    print(f"   note: {len(result['note_trends'])}件")
+    print(f"   日経: {len(result['nikkei_headlines'])}件")
+    print(f"   恐怖指数: {result['fear_greed'].get('rating_jp', '不明')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+minkabu.py - みんかぶ 目標株価・個人投資家/アナリスト予想
+=========================================================
+保有銘柄 + スコア上位銘柄を対象に、デーモンスレッド（MAX_WORKERS 並列）で取得する。
+  - ページは html_text で可視テキストだけを逐次抽出し（TEXT_CHARS 文字で打ち切り）、
+    そのテキストに正規表現1本・1パスで目標株価と2種類の評価を当てる
+  - 結果は銘柄ごとに .cache/minkabu.json へ保存し、TTL_DAYS 日は再取得しない
+    （アナリスト目標は滅多に変わらないので、毎回取りに行くのは新規・期限切れの銘柄だけ）
+"""
+
+import json, os, queue, re, threading, time, urllib.request
+
+import html_text
+import http_cache
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE, ".cache", "minkabu.json")
+PAGE_URL = "https://minkabu.jp/stock/{code}"
+TTL_DAYS = 7
+MAX_WORKERS = 8
+TOP_N = 100             # スコア上位から何銘柄見るか
+REQUEST_TIMEOUT = 10
+TEXT_CHARS = 30000      # ページ先頭からこの文字数だけ読む
+
+LABEL_SPAN = 40         # 見出しと値の間に許す文字数（これより離れた値は別の欄のものとみなす）
+
+PAGE_RE = re.compile(
+    rf'(?:目標株価|理論株価)[^0-9]{{0,{LABEL_SPAN}}}?(?P<target_price>[0-9,]{{3,8}})\s*円'
+    rf'|個人投資家[^買売中]{{0,{LABEL_SPAN}}}?(?P<individual_rating>買い|売り|中立)'
+    rf'|アナリスト[^買売中]{{0,{LABEL_SPAN}}}?(?P<analyst_rating>買い|売り|中立)'
+)
+FIELDS = ("target_price", "individual_rating", "analyst_rating")
+
+
+def parse_page(text):
+    """ページのテキスト → {target_price, individual_rating, analyst_rating}（各項目は最初の一致）"""
+    found = dict.fromkeys(FIELDS)
+    for m in PAGE_RE.finditer(text):
+        key = m.lastgroup
+        if found[key] is None:
+            found[key] = m.group(key)
+            if all(found.values()):
+                break
+    return found
+
+
+def target_codes(stocks_data, portfolio=None, top_n=TOP_N):
+    """保有銘柄 + スコア上位 top_n（重複なし、保有が先）"""
+    held = [p["code"] for p in (portfolio or {}).get("positions", [])]
+    ranked = sorted(stocks_data.get("stocks", []), key=lambda s: s.get("score", 0), reverse=True)
+    return list(dict.fromkeys(held + [s["code"] for s in ranked[:top_n]]))
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp = f"{CACHE_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_PATH)
+
+
+def fetch_one(code, deadline=None):
+    timeout = REQUEST_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise TimeoutError("持ち時間切れ")
+    req = urllib.request.Request(PAGE_URL.format(code=code), headers={"User-Agent": "Mozilla/5.0"})
+    with http_cache.OPENER.open(req, timeout=timeout) as resp:
+        text, _ = html_text.extract(resp, max_chars=TEXT_CHARS, prefer_main=False)
+        return parse_page(text)
+
+
+def fetch_all(codes, deadline=None):
+    """MAX_WORKERS 本のデーモンスレッドで取得 → [(code, data, error)]
+    期限を過ぎても返ってこない銘柄は待たずに「持ち時間切れ」とする（スレッドはプロセス終了を待たせない）"""
+    todo, done = queue.Queue(), queue.Queue()
+    for code in codes:
+        todo.put(code)
+
+    def worker():
+        while True:
+            try:
+                code = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                done.put((code, fetch_one(code, deadline), None))
+            except Exception as e:
+                done.put((code, None, str(e)[:50]))
+
+    for _ in range(min(MAX_WORKERS, len(codes))):
+        threading.Thread(target=worker, daemon=True).start()
+    results = {}
+    while len(results) < len(codes):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            code, data, err = done.get(timeout=timeout)
+        except queue.Empty:
+            break
+        results[code] = (code, data, err)
+    return [results.get(c, (c, None, "持ち時間切れ")) for c in codes]
+
+
+def collect(codes, deadline=None, ttl_days=TTL_DAYS):
+    """銘柄ごとの予想を返す（キャッシュが新しい銘柄はネットワークに出ない）"""
+    cache = load_cache()
+    now = time.time()
+    stale = [c for c in codes if now - cache.get(c, {}).get("fetched_at", 0) >= ttl_days * 86400]
+
+    errors = {}
+    if stale:
+        for code, data, err in fetch_all(stale, deadline):
+            if err is None and not any(data.values()):
+                err = "項目なし"  # ブロック・同意画面・レイアウト変更。空の結果は TTL の間キャッシュしない
+            if err is None:
+                cache[code] = {"fetched_at": now, "data": data}
+            else:
+                errors[code] = err
+        save_cache(cache)
+
+    board = []
+    for code in codes:
+        if code in cache:
+            board.append({"code": code, "source": "minkabu", **cache[code]["data"]})
+        else:
+            board.append({"code": code, "error": errors.get(code, "未取得")})
+    fetched = len(stale) - len(errors)
+    print(f"  💬 みんかぶ: {len(codes)}銘柄（新規取得{fetched} / 失敗{len(errors)} / キャッシュ{len(codes) - len(stale)}）")
+    return board
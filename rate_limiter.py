@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+rate_limiter.py - スレッド間で共有するレートリミッター
+======================================================
+LLM API など「1分あたり N リクエストまで」の相手に、複数スレッドから同時に投げるとき用。
+wait() は次に投げてよい時刻を予約してから、その時刻まで眠る
+（ロックを持ったまま眠らないので、待っている間も他のスレッドは予約できる）。
+
+    limiter = RateLimiter(per_minute=50)
+    limiter.wait()
+    client.messages.create(...)
+"""
+
+import threading, time
+
+
+class RateLimiter:
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+risk_stats.py - daily_nav のリスク指標を逐次更新
+=================================================
+NAV行が1行追加されるたびに、全系列を読み直さずに統計を更新する。
+  - 日次リターンの平均・分散（Welford法）→ 年率ボラティリティ・シャープレシオ
+  - 過去最高NAV → 現在ドローダウン・最大ドローダウン
+  - 日経平均に対するローリングβ（直近 BETA_WINDOW 日、足し引きで更新）
+
+状態は risk_stats.json に保存。同じ日の行を上書きした場合に備えて
+「最終行を入れる前の状態」も持っておき、そこから入れ直す。
+"""
+
+import json, math, os
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+STATS_PATH = os.path.join(BASE, "risk_stats.json")
+BETA_WINDOW = 60       # β計算に使う直近日数
+TRADING_DAYS = 245     # 年率換算の営業日数
+
+
+def empty_stats():
+    return {
+        "n": 0, "mean": 0.0, "m2": 0.0,               # 日次リターン（Welford）
+        "peak": 0.0, "max_dd": 0.0, "nav": 0.0,       # ドローダウン
+        "prev_nav": None, "prev_nikkei": None,
+        "window": [],                                 # β用 [ポートフォリオ, 日経] リターン
+        "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0,  # window の累積和（x=日経, y=ポートフォリオ）
+    }
+
+
+def push(stats, row):
+    """NAV行を1行反映（stats を直接更新して返す）"""
+    nav = row.get("nav") or 0
+    nikkei = row.get("nikkei") or None
+    if nav <= 0:
+        return stats
+
+    if stats["prev_nav"]:
+        r = nav / stats["prev_nav"] - 1
+        stats["n"] += 1
+        delta = r - stats["mean"]
+        stats["mean"] += delta / stats["n"]
+        stats["m2"] += delta * (r - stats["mean"])
+
+        if nikkei and stats["prev_nikkei"]:
+            rm = nikkei / stats["prev_nikkei"] - 1
+            stats["window"].append([r, rm])
+            stats["sx"] += rm
+            stats["sy"] += r
+            stats["sxx"] += rm * rm
+            stats["sxy"] += rm * r
+            if len(stats["window"]) > BETA_WINDOW:
+                old_r, old_rm = stats["window"].pop(0)
+                stats["sx"] -= old_rm
+                stats["sy"] -= old_r
+                stats["sxx"] -= old_rm * old_rm
+                stats["sxy"] -= old_rm * old_r
+
+    stats["peak"] = max(stats["peak"], nav)
+    stats["max_dd"] = min(stats["max_dd"], nav / stats["peak"] - 1)
+    stats["nav"] = nav
+    stats["prev_nav"] = nav
+    stats["prev_nikkei"] = nikkei
+    return stats
+
+
+def summarize(stats):
+    """保存用のサマリー（表示側はこれを読むだけ）"""
+    n = stats["n"]
+    vol = math.sqrt(stats["m2"] / (n - 1)) if n > 1 else 0.0
+    k = len(stats["window"])
+    beta = None
+    if k >= 5:
+        var_x = stats["sxx"] - stats["sx"] ** 2 / k
+        if var_x > 0:
+            beta = round((stats["sxy"] - stats["sx"] * stats["sy"] / k) / var_x, 2)
+    return {
+        "days": n,
+        "volatility_pct": round(vol * math.sqrt(TRADING_DAYS) * 100, 2),
+        "sharpe": round(stats["mean"] / vol * math.sqrt(TRADING_DAYS), 2) if vol > 0 else None,
+        "max_drawdown_pct": round(stats["max_dd"] * 100, 2),
+        "drawdown_pct": round((stats["nav"] / stats["peak"] - 1) * 100, 2) if stats["peak"] else 0.0,
+        "beta": beta,
+        "beta_days": k,
+    }
+
+
+def _copy(stats):
+    return {**stats, "window": [list(w) for w in stats["window"]]}
+
+
+def _save(state):
+    tmp = f"{STATS_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, STATS_PATH)
+
+
+def rebuild(daily_nav):
+    """全系列から作り直す（初回や状態ファイルが壊れた時だけ）"""
+    base = empty_stats()
+    for row in daily_nav[:-1]:
+        push(base, row)
+    cur = push(_copy(base), daily_nav[-1]) if daily_nav else base
+    state = {"last_date": daily_nav[-1]["date"] if daily_nav else None, "base": base, "cur": cur}
+    state["summary"] = summarize(cur)
+    _save(state)
+    return state
+
+
+def load():
+    try:
+        with open(STATS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def update(row, daily_nav=None):
+    """NAV行の追加（同日なら上書き）を反映してサマリーを返す"""
+    state = load()
+    if state is None or (state["last_date"] and row["date"] < state["last_date"]):
+        return rebuild(daily_nav or [row])["summary"]
+
+    if row["date"] == state["last_date"]:
+        state["cur"] = push(_copy(state["base"]), row)
+    else:
+        state["base"] = state["cur"]
+        state["cur"] = push(_copy(state["cur"]), row)
+        state["last_date"] = row["date"]
+    state["summary"] = summarize(state["cur"])
+    _save(state)
+    return state["summary"]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+sentiment_index.py - センチメントの時系列インデックス（SQLite）
+================================================================
+sentiment_data/YYYY-MM-DD.json を「日付 × トピック × チャンネル」の強気/弱気件数に集計して
+.cache/sentiment_index.sqlite に持つ。ファイルごとに内容ハッシュを覚えておき、
+新しい日・中身が変わった日だけ入れ直す（毎回全ファイルを読み直さない）。
+
+そこからトピック別のローリング集計を sentiment_trends.json に書き出す:
+  - mentions_7d / bull_7d / bear_7d   直近 WINDOW_DAYS 日の言及数・強気・弱気
+  - bull_ratio_7d                      強気 / (強気 + 弱気)
+  - momentum                           直近7日の言及数 − その前の7日の言及数
+コメント生成・ダッシュボード・バックテストはこのファイル（または series()）を読むだけでよい。
+"""
+
+import datetime, glob, hashlib, json, os, sqlite3
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+SENTIMENT_DIR = os.path.join(BASE, "sentiment_data")
+DB_PATH = os.path.join(BASE, ".cache", "sentiment_index.sqlite")
+TRENDS_PATH = os.path.join(BASE, "sentiment_trends.json")
+WINDOW_DAYS = 7
+TOP_TOPICS = 30
+
+BULL = {"bullish", "hype"}
+BEAR = {"bearish", "fear"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (date TEXT PRIMARY KEY, sha1 TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS counts (
+    date TEXT NOT NULL, topic TEXT NOT NULL, channel TEXT NOT NULL, category TEXT,
+    bull INTEGER NOT NULL, bear INTEGER NOT NULL, neutral INTEGER NOT NULL,
+    PRIMARY KEY (date, topic, channel)
+);
+CREATE INDEX IF NOT EXISTS counts_topic_date ON counts (topic, date);
+"""
+
+
+def connect(path=DB_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _rows(date, entries):
+    agg = {}
+    for e in entries:
+        key = (e.get("topic", ""), e.get("channel", ""))
+        row = agg.setdefault(key, {"category": e.get("category"), "bull": 0, "bear": 0, "neutral": 0})
+        s = e.get("sentiment")
+        row["bull" if s in BULL else "bear" if s in BEAR else "neutral"] += 1
+    return [(date, t, ch, r["category"], r["bull"], r["bear"], r["neutral"]) for (t, ch), r in agg.items() if t]
+
+
+def update(conn, sentiment_dir=SENTIMENT_DIR):
+    """新しい日・変わった日のファイルだけ取り込む。取り込んだ日数を返す"""
+    known = dict(conn.execute("SELECT date, sha1 FROM files"))
+    changed = 0
+    for path in sorted(glob.glob(os.path.join(sentiment_dir, "*.json"))):
+        date = os.path.basename(path)[:-5]
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if known.get(date) == digest:
+            continue
+        try:
+            entries = json.loads(raw).get("entries", [])
+        except Exception as e:
+            print(f"  ⚠ {path} 読込失敗: {e}")
+            continue
+        with conn:
+            conn.execute("DELETE FROM counts WHERE date = ?", (date,))
+            conn.executemany("INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?, ?)", _rows(date, entries))
+            conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (date, digest))
+        changed += 1
+    return changed
+
+
+def trends(conn, as_of=None, window=WINDOW_DAYS, limit=TOP_TOPICS):
+    """トピック別のローリング集計（直近 window 日とその前の window 日）"""
+    if as_of is None:
+        as_of = conn.execute("SELECT MAX(date) FROM counts").fetchone()[0]
+        if as_of is None:
+            return []
+    end = datetime.date.fromisoformat(as_of)
+    start = (end - datetime.timedelta(days=window - 1)).isoformat()
+    prev_start = (end - datetime.timedelta(days=2 * window - 1)).isoformat()
+    rows = conn.execute("""
+        SELECT topic, MAX(category),
+               SUM(CASE WHEN date >= :start THEN bull + bear + neutral ELSE 0 END) AS mentions,
+               SUM(CASE WHEN date >= :start THEN bull ELSE 0 END),
+               SUM(CASE WHEN date >= :start THEN bear ELSE 0 END),
+               SUM(CASE WHEN date < :start THEN bull + bear + neutral ELSE 0 END),
+               COUNT(DISTINCT CASE WHEN date >= :start THEN channel END)
+        FROM counts
+        WHERE date BETWEEN :prev_start AND :end
+        GROUP BY topic
+        HAVING mentions > 0
+        ORDER BY mentions DESC, topic
+        LIMIT :limit
+    """, {"start": start, "prev_start": prev_start, "end": as_of, "limit": limit}).fetchall()
+    out = []
+    for topic, category, mentions, bull, bear, prev, channels in rows:
+        out.append({
+            "topic": topic,
+            "category": category,
+            "mentions_7d": mentions,
+            "bull_7d": bull,
+            "bear_7d": bear,
+            "bull_ratio_7d": round(bull / (bull + bear), 2) if bull + bear else None,
+            "net_polarity_7d": round((bull - bear) / mentions, 2),
+            "mentions_prev_7d": prev,
+            "momentum": mentions - prev,
+            "channels_7d": channels,
+        })
+    return out
+
+
+def series(conn, topic, days=30):
+    """1トピックの日別 [(date, bull, bear, neutral), ...]（古い順）"""
+    return conn.execute("""
+        SELECT date, SUM(bull), SUM(bear), SUM(neutral) FROM counts
+        WHERE topic = ? GROUP BY date ORDER BY date DESC LIMIT ?
+    """, (topic, days)).fetchall()[::-1]
+
+
+def export_trends(conn, path=TRENDS_PATH):
+    as_of = conn.execute("SELECT MAX(date) FROM counts").fetchone()[0]
+    data = {"as_of": as_of, "window_days": WINDOW_DAYS, "topics": trends(conn, as_of)}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return data
+
+
+def main():
+    conn = connect()
+    changed = update(conn)
+    data = export_trends(conn)
+    print(f"📈 センチメント時系列: {changed}日分を更新 / 基準日 {data['as_of']} / {len(data['topics'])}トピック")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,23 @@ summarize_articles.py - 記事本文を取得してClaude APIで要約
 market_intelligence.json の Google News / 株探 / note から
 記事URLをfetch → 本文抽出 → 要約生成 → 保存
 
+取得と要約はパイプラインで並行に流す:
+  本文取得スレッド（FETCH_WORKERS）→ 有界キュー → 要約スレッド（LLM_WORKERS、RateLimiterで毎分 LLM_RPM まで）
+要約スレッドはキューから入力トークン SUMMARY_BATCH_TOKENS 分までの記事をまとめて取り
+（1件目から最大 SUMMARY_BATCH_WAIT_SEC 秒は後続の記事を待つ）、
+1リクエストで要約する（tool use の JSONスキーマで配列を返させ、検証に落ちた記事だけ1件ずつ再要約）。
+要約が1件終わるたびに出力ファイルを書き直す。
+同じ記事（正規化URL + 本文のハッシュが一致）は .cache/summaries.json の要約を使い回し、APIを呼ばない。
+
 出力: article_summaries/YYYY-MM-DD.json
 """
 
-import json, os, sys, datetime, urllib.request, re, time
+import json, os, sys, datetime, time, queue, threading, hashlib, urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import html_text
+import http_cache
+from rate_limiter import RateLimiter
 
 JST = datetime.timezone(datetime.timedelta(hours=9))
 NOW = datetime.datetime.now(JST)
@@ -29,27 +42,46 @@ if not API_KEY:
 client = anthropic.Anthropic(api_key=API_KEY)
 MODEL = "claude-sonnet-4-20250514"
 
+FETCH_WORKERS = 6
+LLM_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "3"))
+LLM_RPM = int(os.environ.get("SUMMARY_RPM", "50"))   # 要約リクエストの上限（毎分）
+LLM_TIMEOUT_SEC = 45                                  # 1記事あたりの要約待ち上限
+QUEUE_SIZE = 8                                        # 取得済み・未要約の記事を溜める上限
+BATCH_MAX_ARTICLES = 8
+PROMPT_TEXT_CHARS = 3000                              # 1記事あたりプロンプトに入れる本文の長さ
+# 1リクエストに詰める入力トークンの目安（既定は本文上限の記事が BATCH_MAX_ARTICLES 本入る量）
+BATCH_TOKENS = int(os.environ.get("SUMMARY_BATCH_TOKENS", str(BATCH_MAX_ARTICLES * (PROMPT_TEXT_CHARS + 150))))
+# 1件目を取ってから後続の記事を待つ最大秒数（本文取得は要約より遅いので、待たないとほぼ1件ずつになる）
+BATCH_WAIT_SEC = float(os.environ.get("SUMMARY_BATCH_WAIT_SEC", "5"))
+SUMMARY_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "summaries.json")
+SUMMARY_CACHE_DAYS = 14                               # これより古い要約キャッシュは捨てる
 
-def fetch_article_text(url, max_chars=5000):
-    """URLから記事本文テキストを抽出"""
-    try:
-        req = urllib.request.Request(url, headers={
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-        })
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            html = resp.read().decode("utf-8", errors="ignore")
 
-        # HTMLタグ除去
-        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL)
-        text = re.sub(r'<[^>]+>', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+ARTICLE_CACHE_SEC = 7 * 86400  # 記事本文は一度取れたら1週間使い回す
+
 
-        # 短すぎる場合はスキップ
-        if len(text) < 200:
-            return None
+def extract_text(resp, max_chars=5000):
+    """レスポンスを読みながら本文テキストを抽出（短すぎる場合は None）"""
+    text, _ = html_text.extract(resp, max_chars=max_chars)
 
-        return text[:max_chars]
+    # 短すぎる場合はスキップ
+    if len(text) < 200:
+        return None
+    return text
+
+
+def fetch_article_text(url, max_chars=5000):
+    """URLから記事本文テキストを抽出（http_cache 経由）"""
+    try:
+        text = http_cache.cached_get(
+            url,
+            lambda resp: extract_text(resp, max_chars),
+            namespace="article_text",
+            headers={"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"},
+            timeout=15,
+            max_age=ARTICLE_CACHE_SEC,
+        )
+        return text[:max_chars] if text else None
     except Exception as e:
         print(f"    ⚠ fetch失敗: {e}")
         return None
@@ -61,13 +93,14 @@ def summarize_text(title, text):
         response = client.messages.create(
             model=MODEL,
             max_tokens=300,
+            timeout=LLM_TIMEOUT_SEC,
             messages=[{
                 "role": "user",
                 "content": f"""以下の記事を日本株投資家向けに3行で要約してください。
 重要な数値（株価、%、金額）は必ず含めてください。
 
 タイトル: {title}
-本文: {text[:3000]}
+本文: {text[:PROMPT_TEXT_CHARS]}
 
 要約（3行、各行50文字以内）:"""
             }]
@@ -78,6 +111,212 @@ def summarize_text(title, text):
         return None
 
 
+SUMMARY_TOOL = {
+    "name": "record_summaries",
+    "description": "各記事の要約を記録する",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "summaries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer", "description": "記事番号"},
+                        "summary": {"type": "string", "description": "3行要約（各行50文字以内、改行区切り）"},
+                    },
+                    "required": ["id", "summary"],
+                },
+            }
+        },
+        "required": ["summaries"],
+    },
+}
+
+
+def estimate_tokens(title, text):
+    """入力トークンの概算（日本語は1文字≒1トークンで見積もる）"""
+    return len(title) + min(len(text), PROMPT_TEXT_CHARS) + 50
+
+
+def parse_batch_summaries(response, n):
+    """tool use の結果 → [要約 or None] * n（スキーマ違反の項目は None）"""
+    out = [None] * n
+    for block in response.content:
+        if getattr(block, "type", None) != "tool_use":
+            continue
+        items = (block.input or {}).get("summaries")
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            idx, summary = item.get("id"), item.get("summary")
+            if isinstance(idx, int) and 1 <= idx <= n and isinstance(summary, str) and summary.strip():
+                out[idx - 1] = summary.strip()
+    return out
+
+
+def summarize_batch(articles, limiter=None):
+    """[(title, text), ...] をまとめて1リクエストで要約。失敗した記事だけ summarize_text で1件ずつ
+
+    limiter: 個別にやり直す各リクエストの前に wait() する（まとめ分の1回は呼び出し側で待つ）
+    """
+    if len(articles) == 1:
+        return [summarize_text(*articles[0])]
+    body = "\n\n".join(
+        f"[記事{k}]\nタイトル: {title}\n本文: {text[:PROMPT_TEXT_CHARS]}"
+        for k, (title, text) in enumerate(articles, 1))
+    summaries = [None] * len(articles)
+    try:
+        response = client.messages.create(
+            model=MODEL,
+            max_tokens=min(300 * len(articles), 4096),
+            timeout=LLM_TIMEOUT_SEC,
+            tools=[SUMMARY_TOOL],
+            tool_choice={"type": "tool", "name": SUMMARY_TOOL["name"]},
+            messages=[{
+                "role": "user",
+                "content": f"""以下の{len(articles)}本の記事を、それぞれ日本株投資家向けに3行で要約してください。
+重要な数値（株価、%、金額）は必ず含めてください。
+結果は record_summaries に、記事番号（id）ごとに1件ずつ記録してください。
+
+{body}"""
+            }]
+        )
+        summaries = parse_batch_summaries(response, len(articles))
+    except Exception as e:
+        print(f"    ⚠ まとめて要約失敗（{len(articles)}件）: {e}")
+    missing = [k for k, sm in enumerate(summaries) if sm is None]
+    if missing and len(missing) < len(articles):
+        print(f"    ⚠ {len(missing)}件は個別に要約し直します")
+    for k in missing:
+        if limiter:
+            limiter.wait()
+        summaries[k] = summarize_text(*articles[k])
+    return summaries
+
+
+# ─── 要約キャッシュ ───
+def normalize_url(url):
+    """スキーム/ホストの大小・フラグメント・utm_* パラメータ・末尾スラッシュの違いを吸収"""
+    u = urllib.parse.urlsplit(url.strip())
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(u.query, keep_blank_values=True)
+             if not k.startswith("utm_")]
+    return urllib.parse.urlunsplit((
+        u.scheme.lower(), u.netloc.lower(), u.path.rstrip("/") or "/",
+        urllib.parse.urlencode(sorted(query)), ""))
+
+
+def summary_key(url, text):
+    return hashlib.sha1(f"{normalize_url(url)}\n{text}".encode("utf-8")).hexdigest()
+
+
+def load_summary_cache():
+    try:
+        with open(SUMMARY_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except Exception:
+        return {}
+    cutoff = time.time() - SUMMARY_CACHE_DAYS * 86400
+    return {k: v for k, v in cache.items() if v.get("at", 0) >= cutoff}
+
+
+def save_summary_cache(cache):
+    os.makedirs(os.path.dirname(SUMMARY_CACHE_PATH), exist_ok=True)
+    tmp = f"{SUMMARY_CACHE_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, SUMMARY_CACHE_PATH)
+
+
+def run_pipeline(targets, on_result, cache=None):
+    """本文取得 → 要約 を並行実行。1記事終わるごとに on_result(i, target, text, summary, cached) を呼ぶ
+
+    text が None なら本文取得不可、summary が None なら要約失敗。
+    cache（summary_key → {"summary", "at"}）に当たった記事は要約スレッドに回さない（cached=True）。
+    on_result は呼び出し元スレッドでだけ呼ばれる（ファイル書き込みを直列にするため）。
+    """
+    work = queue.Queue(maxsize=QUEUE_SIZE)
+    results = queue.Queue()
+    limiter = RateLimiter(LLM_RPM)
+
+    def fetch(i, target):
+        text = None
+        try:
+            text = fetch_article_text(target["url"])
+        finally:
+            hit = (cache or {}).get(summary_key(target["url"], text)) if text else None
+            if hit:
+                results.put((i, target, text, hit["summary"], True))
+            elif text:
+                work.put((i, target, text))  # キューが一杯なら要約が追いつくまで待つ
+            else:
+                results.put((i, target, None, None, False))
+
+    def next_batch(carry):
+        """1件目は待って取り（前回あふれた carry があればそれ）、
+        あとは BATCH_WAIT_SEC 秒まで後続を待ちながら BATCH_TOKENS・BATCH_MAX_ARTICLES 分まで詰める
+
+        戻り値: (バッチ, 次回に回す記事, 終了フラグ)
+        """
+        item = carry if carry is not None else work.get()
+        if item is None:
+            return [], None, True
+        batch, tokens = [item], estimate_tokens(item[1]["title"], item[2])
+        until = time.monotonic() + BATCH_WAIT_SEC
+        while len(batch) < BATCH_MAX_ARTICLES:
+            try:
+                item = work.get(timeout=max(0.0, until - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, None, True
+            cost = estimate_tokens(item[1]["title"], item[2])
+            if tokens + cost > BATCH_TOKENS:
+                return batch, item, False
+            batch.append(item)
+            tokens += cost
+        return batch, None, False
+
+    def summarize_worker():
+        carry, stop = None, False
+        while not stop:
+            batch, carry, stop = next_batch(carry)
+            if not batch:
+                return
+            summaries = [None] * len(batch)
+            try:
+                limiter.wait()
+                summaries = summarize_batch([(target["title"], text) for _, target, text in batch], limiter)
+            finally:
+                for (i, target, text), summary in zip(batch, summaries):
+                    results.put((i, target, text, summary, False))
+
+    workers = [threading.Thread(target=summarize_worker, daemon=True) for _ in range(LLM_WORKERS)]
+    for t in workers:
+        t.start()
+    fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+    for i, target in enumerate(targets):
+        fetch_pool.submit(fetch, i, target)
+
+    def close():
+        fetch_pool.shutdown(wait=True)
+        for _ in workers:
+            work.put(None)
+    threading.Thread(target=close, daemon=True).start()
+
+    for _ in range(len(targets)):
+        on_result(*results.get())
+
+
+def save_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
 def main():
     # market_intelligence.json 読み込み
     try:
@@ -123,51 +362,53 @@ def main():
 
     print(f"📰 {len(targets)}件の記事を処理します\n")
 
-    for i, target in enumerate(targets):
-        print(f"[{i+1}/{len(targets)}] {target['title'][:40]}...")
+    os.makedirs("article_summaries", exist_ok=True)
+    output_path = f"article_summaries/{DATE_STR}.json"
+    done = []  # (対象の順番, 要約)
+    cache = load_summary_cache()
+    billed = []  # 実際にAPIを呼んだ記事の本文長
 
-        # 1. 本文取得
-        text = fetch_article_text(target["url"])
+    def on_result(i, target, text, summary, cached):
+        done.append((i, None))
+        head = f"[{len(done)}/{len(targets)}] {target['title'][:40]}..."
         if not text:
-            print("    → スキップ（本文取得不可）")
-            continue
-
-        # 2. Claude API で要約
-        summary = summarize_text(target["title"], text)
+            print(f"{head}\n    → スキップ（本文取得不可）")
+            return
         if not summary:
-            print("    → スキップ（要約失敗）")
-            continue
-
-        summaries["articles"].append({
+            print(f"{head}\n    → スキップ（要約失敗）")
+            return
+        done[-1] = (i, {
             "source": target["source"],
             "title": target["title"][:80],
             "url": target["url"],
             "summary": summary,
             "text_length": len(text)
         })
-        print(f"    ✅ 要約完了（{len(text)}文字 → {len(summary)}文字）")
-
-        # レートリミット対策
-        time.sleep(1)
-
-    # 保存
-    os.makedirs("article_summaries", exist_ok=True)
-    output_path = f"article_summaries/{DATE_STR}.json"
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(summaries, f, ensure_ascii=False, indent=2)
+        if cached:
+            print(f"{head}\n    ♻ キャッシュ（{len(text)}文字 → {len(summary)}文字）")
+        else:
+            cache[summary_key(target["url"], text)] = {"summary": summary, "at": time.time()}
+            billed.append(len(text))
+            print(f"{head}\n    ✅ 要約完了（{len(text)}文字 → {len(summary)}文字）")
+        # 途中経過も書き出す（並びは対象リストの順）
+        summaries["articles"] = [a for _, a in sorted(done, key=lambda x: x[0]) if a]
+        save_json(output_path, summaries)
+
+    run_pipeline(targets, on_result, cache)
+    save_json(output_path, summaries)
+    save_summary_cache(cache)
 
     # 最新版も保存（コメント生成用）
-    with open("article_summaries_latest.json", "w", encoding="utf-8") as f:
-        json.dump(summaries, f, ensure_ascii=False, indent=2)
+    save_json("article_summaries_latest.json", summaries)
 
     print(f"\n🎉 {len(summaries['articles'])}件の要約を保存")
     print(f"   📁 {output_path}")
     print(f"   📁 article_summaries_latest.json")
 
-    # コスト概算
-    total_input = sum(a.get("text_length", 0) for a in summaries["articles"])
-    est_cost = (total_input / 1000) * 0.003 + len(summaries["articles"]) * 0.005
-    print(f"   💰 推定コスト: ${est_cost:.3f}")
+    # コスト概算（キャッシュヒット分はAPIを呼んでいないので除外）
+    est_cost = (sum(billed) / 1000) * 0.003 + len(billed) * 0.005
+    hits = len(summaries["articles"]) - len(billed)
+    print(f"   💰 推定コスト: ${est_cost:.3f}（API {len(billed)}件 / キャッシュ {hits}件）")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+tdnet.py - TDnet 適時開示の取り込み（1日分・差分更新）
+=======================================================
+I_list_001_YYYYMMDD.html, I_list_002_... と1日の全ページを順にたどり、
+開示を (code, time, title) をキーにした日別インデックスへ保存する。
+
+TDnet の一覧は新しい順に並ぶので、2回目以降は先頭ページから読んで
+「既に知っている開示」に当たった時点で打ち切る（=新着分だけ取得）。
+前回が途中で打ち切られていた場合（complete=False）は最後まで読み直す。
+
+インデックス: .cache/tdnet/YYYYMMDD.json
+  {"date", "complete", "items": [{"time", "code", "name", "title", "url"}, ...]}
+
+使い方:
+    by_code = tdnet.disclosures_by_code(tdnet.ingest(), codes=UNIVERSE)
+    if code in by_code: ...   # 「今日開示があった銘柄」を O(1) で判定
+"""
+
+import datetime, json, os, re, time, urllib.error, urllib.request
+
+import http_cache
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.path.join(BASE, ".cache", "tdnet")
+LIST_URL = "https://www.release.tdnet.info/inbs/I_list_{page:03d}_{date}.html"
+PDF_BASE = "https://www.release.tdnet.info/inbs/"
+MAX_PAGES = 50          # 1ページ100件 → 5000件まで
+REQUEST_TIMEOUT = 10
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+ROW_SPLIT_RE = re.compile(r'<tr[\s>]', re.I)
+CELL_RE = re.compile(r'class="[^"]*\bkj(?P<field>Time|Code|Name|Title)\b[^"]*"[^>]*>(?P<body>.*?)</td>', re.S)
+HREF_RE = re.compile(r'<a[^>]*href="(?P<href>[^"]+)"')
+TAG_RE = re.compile(r'<[^>]+>')
+TIME_RE = re.compile(r'\d{1,2}:\d{2}')
+CODE_RE = re.compile(r'[0-9A-Z]{4,5}')
+
+
+def _cell_text(body):
+    return " ".join(TAG_RE.sub("", body).split())
+
+
+def parse_row(row):
+    """<tr> 1行ぶんの HTML → 開示 or None（時刻・コード・表題のどれかが欠けた行は捨てる）
+    フィールドは行の中だけで探すので、崩れた行があっても隣の行の値と混ざらない"""
+    cells = {m.group("field"): m.group("body") for m in CELL_RE.finditer(row)}
+    time_ = TIME_RE.fullmatch(_cell_text(cells.get("Time", "")))
+    code = CODE_RE.fullmatch(_cell_text(cells.get("Code", "")))
+    title = _cell_text(cells.get("Title", ""))
+    if not (time_ and code and title):
+        return None
+    href = HREF_RE.search(cells["Title"])
+    return {
+        "time": time_.group(),
+        "code": code.group()[:4],  # 5桁コード（末尾0）→ 4桁
+        "name": _cell_text(cells.get("Name", "")),
+        "title": title,
+        "url": PDF_BASE + href.group("href") if href else "",
+    }
+
+
+def parse_page(html):
+    """一覧ページ1枚 → 開示リスト（ページ内の並び順のまま）"""
+    return [d for d in map(parse_row, ROW_SPLIT_RE.split(html)[1:]) if d]
+
+
+def item_key(d):
+    return f"{d['code']}|{d['time']}|{d['title']}"
+
+
+def _index_path(ymd):
+    return os.path.join(INDEX_DIR, f"{ymd}.json")
+
+
+def load_index(ymd):
+    try:
+        with open(_index_path(ymd), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"date": ymd, "complete": False, "items": []}
+
+
+def _save_index(index):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = _index_path(index["date"])
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _fetch(url, deadline):
+    timeout = REQUEST_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise TimeoutError("持ち時間切れ")
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with http_cache.OPENER.open(req, timeout=timeout) as resp:
+        return resp.read().decode("utf-8", errors="ignore")
+
+
+def ingest(date=None, deadline=None, max_pages=MAX_PAGES):
+    """指定日（省略時はJSTの今日）の開示を差分取得し、全件（新しい順）を返す
+
+    deadline: time.monotonic() 基準の期限。過ぎたら取得済み分だけ保存して返す
+    2ページ目以降で通信エラーになった場合も、そこまでの分を保存して返す（次回は最後まで読み直す）
+    """
+    ymd = (date or datetime.datetime.now(JST)).strftime("%Y%m%d")
+    index = load_index(ymd)
+    known = {item_key(d) for d in index["items"]}
+    stop_at_known = index["complete"]
+
+    new, complete = [], False
+    for page in range(1, max_pages + 1):
+        try:
+            html = _fetch(LIST_URL.format(page=page, date=ymd), deadline)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:  # ページ切れ = 最後まで読んだ
+                complete = True
+                break
+            if page == 1:
+                raise
+            print(f"  ⚠ TDnet {page}ページ目で中断（{e}）→ 取得済み分を保存")
+            break
+        except TimeoutError:
+            break
+        except OSError as e:  # URLError（DNS失敗・接続リセットなど）
+            if page == 1:
+                raise
+            print(f"  ⚠ TDnet {page}ページ目で中断（{e}）→ 取得済み分を保存")
+            break
+        rows = parse_page(html)
+        if not rows:
+            complete = True
+            break
+        fresh = [d for d in rows if item_key(d) not in known]
+        new += fresh
+        known.update(item_key(d) for d in fresh)
+        if stop_at_known and len(fresh) < len(rows):
+            complete = True  # 既知の開示に到達 → 以降は取得済み
+            break
+
+    if new or complete != index["complete"]:
+        index["items"] = sorted(new + index["items"], key=lambda d: d["time"].zfill(5), reverse=True)
+        index["complete"] = complete  # 途中で切れたら次回は最後まで読み直す
+        _save_index(index)
+    return index["items"]
+
+
+def disclosures_by_code(items, codes=None):
+    """開示リスト → {code: [開示, ...]}（codes を渡すとその銘柄だけ）"""
+    wanted = set(codes) if codes is not None else None
+    by_code = {}
+    for d in items:
+        if wanted is None or d["code"] in wanted:
+            by_code.setdefault(d["code"], []).append(d)
+    return by_code
@@ -0,0 +1,45 @@
+"""全体期限: 応答しないソースがあってもプロセスが期限どおりに終わるか"""
+
+import os, subprocess, sys, textwrap, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HANGING_RUN = textwrap.dedent("""
+    import time
+    import market_intelligence as mi
+
+    def hang(deadline=None):
+        time.sleep(60)
+
+    mi.SOURCES = [
+        ("fear_greed", "fast", lambda deadline=None: {"score": 1}),
+        ("google_news", "hang", hang),
+    ]
+    result = mi.collect(deadline_sec=1, publish_path=None)
+    print(result["pending_sources"], result["fear_greed"])
+""")
+
+
+def test_hanging_source_does_not_delay_exit():
+    start = time.monotonic()
+    out = subprocess.run([sys.executable, "-c", HANGING_RUN], cwd=ROOT,
+                         capture_output=True, text=True, timeout=30)
+    assert out.returncode == 0, out.stderr
+    assert time.monotonic() - start < 10
+    assert "['google_news'] {'score': 1}" in out.stdout
+
+
+def test_minkabu_fetch_all_gives_up_at_deadline(monkeypatch):
+    import minkabu
+
+    def fetch_one(code, deadline=None):
+        if code == "9999":
+            time.sleep(60)
+        return {"target_price": "1,000"}
+
+    monkeypatch.setattr(minkabu, "fetch_one", fetch_one)
+    start = time.monotonic()
+    out = minkabu.fetch_all(["7203", "9999"], deadline=time.monotonic() + 0.5)
+    assert time.monotonic() - start < 5
+    assert out[0] == ("7203", {"target_price": "1,000"}, None)
+    assert out[1] == ("9999", None, "持ち時間切れ")
@@ -0,0 +1,65 @@
+"""minkabu.parse_page / collect: 銘柄ページの断片から目標株価・評価を拾う"""
+
+import io
+
+import html_text
+import minkabu
+
+PAGE = """
+<html><body>
+<div class="md_stockBoard">
+  <h1>トヨタ自動車 (7203)</h1>
+  <div class="stock_price">2,845.5<span>円</span></div>
+</div>
+<div class="ly_content">
+  <div class="md_card">
+    <h2>目標株価</h2>
+    <div class="fwb">3,320<span>円</span></div>
+    <p>現在株価との差 +474.5円</p>
+  </div>
+  <div class="md_card">
+    <h2>アナリストの予想</h2>
+    <div class="md_target_box"><span class="icn_buy">買い</span></div>
+  </div>
+  <div class="md_card">
+    <h2>個人投資家の予想</h2>
+    <div class="md_target_box"><span class="icn_sell">売り</span></div>
+  </div>
+</div>
+</body></html>
+"""
+
+# 目標株価が未算出（「--」）で、ずっと下に関係ない数字と「買い」がある
+PAGE_NO_TARGET = """
+<html><body>
+<div class="md_card"><h2>目標株価</h2><div class="fwb">--</div></div>
+<div class="md_card"><h2>アナリストの予想</h2><div>まだ予想がありません。アナリストが予想を公開するとここに表示されます。</div></div>
+<div class="md_list">""" + "<p>関連ニュースの見出しがここに並びます。</p>" * 20 + """
+<p>信用取引の買い残は 12,300 円相当</p>
+</div>
+</body></html>
+"""
+
+
+def page_text(html):
+    text, _ = html_text.extract(io.BytesIO(html.encode("utf-8")), max_chars=minkabu.TEXT_CHARS, prefer_main=False)
+    return text
+
+
+def test_parse_page():
+    assert minkabu.parse_page(page_text(PAGE)) == {
+        "target_price": "3,320", "individual_rating": "売り", "analyst_rating": "買い"}
+
+
+def test_parse_page_ignores_values_far_from_the_label():
+    assert minkabu.parse_page(page_text(PAGE_NO_TARGET)) == dict.fromkeys(minkabu.FIELDS)
+
+
+def test_collect_does_not_cache_empty_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(minkabu, "CACHE_PATH", str(tmp_path / "minkabu.json"))
+    monkeypatch.setattr(minkabu, "fetch_one",
+                        lambda code, deadline=None: minkabu.parse_page(page_text(PAGE if code == "7203" else "<p>アクセスが集中しています</p>")))
+    board = minkabu.collect(["7203", "9999"])
+    assert board[0]["target_price"] == "3,320"
+    assert board[1] == {"code": "9999", "error": "項目なし"}
+    assert set(minkabu.load_cache()) == {"7203"}
@@ -0,0 +1,39 @@
+"""tdnet.parse_page: 一覧ページの行ごとの取り出し"""
+
+import tdnet
+
+
+def row(time="15:30", code="72030", name="トヨタ自動車", title='<a href="140120251015500001.pdf" target="_blank">2026年3月期 第2四半期決算短信</a>'):
+    return (f'<tr><td class="oddnew-L kjTime" noWrap>{time}</td>'
+            f'<td class="oddnew-M kjCode" noWrap>{code}</td>'
+            f'<td class="oddnew-M kjName" noWrap>{name}</td>'
+            f'<td class="oddnew-M kjTitle" align="left">{title}</td>'
+            f'<td class="oddnew-M kjXbrl" noWrap></td>'
+            f'<td class="oddnew-M kjPlace" noWrap>東</td></tr>\n')
+
+
+def page(*rows):
+    return '<table id="main-list-table">\n' + "".join(rows) + "</table>"
+
+
+def test_parse_page():
+    items = tdnet.parse_page(page(row(), row("15:00", "67580", "ソニーグループ",
+                                             '<a href="140120251015500002.pdf">自己株式の取得状況に関するお知らせ</a>')))
+    assert items == [
+        {"time": "15:30", "code": "7203", "name": "トヨタ自動車", "title": "2026年3月期 第2四半期決算短信",
+         "url": tdnet.PDF_BASE + "140120251015500001.pdf"},
+        {"time": "15:00", "code": "6758", "name": "ソニーグループ", "title": "自己株式の取得状況に関するお知らせ",
+         "url": tdnet.PDF_BASE + "140120251015500002.pdf"},
+    ]
+
+
+def test_malformed_row_does_not_borrow_from_the_next_row():
+    items = tdnet.parse_page(page(
+        row("15:30", "", "コード欠け"),                                   # kjCode が空 → 捨てる
+        row("15:20", "99840", "ソフトバンクグループ", "訂正のお知らせ（リンクなし）"),  # 表題に <a> がない
+        row("15:10", "80350", "東京エレクトロン", '<a href="3.pdf">業績予想の修正</a>'),
+    ))
+    assert [(d["time"], d["code"], d["title"], d["url"]) for d in items] == [
+        ("15:20", "9984", "訂正のお知らせ（リンクなし）", ""),
+        ("15:10", "8035", "業績予想の修正", tdnet.PDF_BASE + "3.pdf"),
+    ]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+tradingview.py - TradingView スキャナーのテクニカル評価をまとめて取得
+====================================================================
+scanner.tradingview.com/japan/scan は1回のPOSTで大量のティッカーを受け付けるので、
+ユニバース全体を CHUNK_SIZE 件ずつに分けて数リクエストで取り切る。
+取得済みのコードはプロセス内で覚えておき、同じ実行中の再取得はしない。
+
+返す値（銘柄ごと、-1〜+1）:
+  tv_all  Recommend.All   総合
+  tv_ma   Recommend.MA    移動平均系
+  tv_osc  Recommend.Other オシレーター系
+"""
+
+import json, urllib.request
+
+import http_cache
+
+SCAN_URL = "https://scanner.tradingview.com/japan/scan"
+COLUMNS = ["Recommend.All", "Recommend.MA", "Recommend.Other"]
+FIELDS = ["tv_all", "tv_ma", "tv_osc"]
+CHUNK_SIZE = 400
+REQUEST_TIMEOUT = 15
+
+_memo = {}  # code → {tv_all, tv_ma, tv_osc}（この実行中のキャッシュ）
+
+
+def _post(tickers, timeout):
+    payload = json.dumps({
+        "symbols": {"tickers": tickers, "query": {"types": []}},
+        "columns": COLUMNS,
+    }).encode("utf-8")
+    req = urllib.request.Request(SCAN_URL, data=payload, headers={
+        "Content-Type": "application/json", "User-Agent": "Mozilla/5.0"})
+    with http_cache.OPENER.open(req, timeout=timeout) as resp:
+        return json.loads(resp.read()).get("data", [])
+
+
+def fetch_recommendations(codes, timeout=REQUEST_TIMEOUT):
+    """銘柄コードのリスト → {code: {tv_all, tv_ma, tv_osc}}（取れなかった銘柄は含まない）"""
+    codes = list(dict.fromkeys(str(c) for c in codes))
+    missing = [c for c in codes if c not in _memo]
+    for i in range(0, len(missing), CHUNK_SIZE):
+        chunk = missing[i:i + CHUNK_SIZE]
+        for item in _post([f"TSE:{c}" for c in chunk], timeout):
+            code = item.get("s", "").replace("TSE:", "")
+            vals = item.get("d") or [None] * len(FIELDS)
+            _memo[code] = {f: round(v, 3) if v is not None else None for f, v in zip(FIELDS, vals)}
+    return {c: _memo[c] for c in codes if c in _memo}
+
+
+def signal_jp(score):
+    """総合スコア → 日本語シグナル"""
+    score = score or 0
+    if score >= 0.5:
+        return "強い買い"
+    if score >= 0.1:
+        return "買い"
+    if score >= -0.1:
+        return "中立"
+    if score >= -0.5:
+        return "売り"
+    return "強い売り"